@@ -0,0 +1,5 @@
+"""
+Benchmarks of bratiaa on synthetic brat projects (see `benchmarks.generate`), run with `make bench` or
+
+    python -m benchmarks.run --compare benchmarks/baseline.json
+"""
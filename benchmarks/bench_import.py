@@ -0,0 +1,41 @@
+"""
+Benchmark of the import time of bratiaa (cumulative, without numpy) in fresh interpreters, checked against a budget:
+
+    python -m benchmarks.bench_import --budget-ms 300
+"""
+import argparse
+import subprocess
+import sys
+
+
+def import_times(module):
+    """
+    Cumulative import times (microseconds) by module, measured in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='bratiaa')
+    parser.add_argument('--budget-ms', type=float, default=300, help='Fails if the best import time is slower')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(args)
+
+    times = min((import_times(args.module) for _ in range(args.repeat)), key=lambda t: t[args.module])
+    numpy_ms = times.get('numpy', 0) / 1000
+    import_ms = times[args.module] / 1000 - numpy_ms
+    print(f'{args.module:<20} {import_ms:>10.1f} ms (numpy {numpy_ms:.1f} ms, budget {args.budget_ms:.0f} ms)')
+    return int(import_ms >= args.budget_ms)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
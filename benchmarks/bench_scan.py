@@ -0,0 +1,82 @@
+"""
+Benchmark of project scanning: the `os.scandir` based `input_generator` against the former per-annotator recursive
+glob on a synthetic tree of empty ANN files.
+
+    python -m benchmarks.bench_scan --files 1000000 --annotators 4
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from bratiaa.agree import input_generator, Document, AnnFile
+
+
+def glob_input_generator(root):
+    """
+    Former implementation based on `Path.glob('**/*.ann')` per annotator.
+    """
+    root = Path(root)
+    annotators = [subdir.parts[-1] for subdir in root.glob('*/') if subdir.is_dir()]
+    intersection = None
+    for annotator in annotators:
+        subdir_path = root / annotator
+        relative_paths = {path.relative_to(subdir_path).as_posix() for path in subdir_path.glob('**/*.ann')}
+        intersection = relative_paths if intersection is None else intersection.intersection(relative_paths)
+    for rel_path in sorted(intersection):
+        document = Document((root / annotators[0] / rel_path).as_posix()[:-3] + 'txt', doc_id=rel_path)
+        for annotator in annotators:
+            document.ann_files.append(AnnFile(annotator, root / annotator / rel_path))
+        yield document
+
+
+def create_tree(root, num_files, num_annotators, files_per_dir):
+    """
+    Distributes num_files ANN files evenly over the annotators' directories (files_per_dir files per subdirectory).
+    """
+    docs_per_annotator = num_files // num_annotators
+    for annotator in range(num_annotators):
+        for doc in range(docs_per_annotator):
+            directory = os.path.join(root, f'annotator-{annotator}', f'batch-{doc // files_per_dir}')
+            if doc % files_per_dir == 0:
+                os.makedirs(directory)
+            open(os.path.join(directory, f'doc-{doc}.ann'), 'w').close()
+
+
+def measure(name, input_gen, root, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        num_documents = sum(1 for _ in input_gen(root))
+        best = min(best, time.perf_counter() - start)
+    print(f'{name:<20} {num_documents:>10} documents {best:>10.3f} s')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=1_000_000, help='Total number of ANN files')
+    parser.add_argument('--annotators', type=int, default=4)
+    parser.add_argument('--files-per-dir', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=8, help='Threads for the concurrent scan')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--root', help='Existing synthetic tree (created in a temporary directory otherwise)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = args.root
+        if not root:
+            root = tmp_dir
+            start = time.perf_counter()
+            create_tree(root, args.files, args.annotators, args.files_per_dir)
+            print(f'Created {args.files} files in {time.perf_counter() - start:.1f} s')
+        glob_time = measure('glob', glob_input_generator, root, args.repeat)
+        scandir_time = measure('scandir', input_generator, root, args.repeat)
+        threaded_time = measure(f'scandir ({args.threads} threads)',
+                                lambda r: input_generator(r, threads=args.threads), root, args.repeat)
+        print(f'Speedup: {glob_time / scandir_time:.1f}x (threaded: {glob_time / threaded_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
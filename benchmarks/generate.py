@@ -0,0 +1,152 @@
+"""
+Deterministic generator of synthetic brat projects: one directory per annotator with identical texts and annotations
+that deviate from a common set of reference entities.
+
+    python -m benchmarks.generate /tmp/project --annotators 4 --documents 1000 --disagreement 0.2
+"""
+import argparse
+import os
+import random
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class ProjectSpec:
+    """
+    Parameters of a synthetic project. Density is the probability of an entity starting at a token, disagreement the
+    probability of an annotator deviating from the reference for an entity (dropping, relabeling or shifting it) and
+    discontinuous the fraction of entities with two fragments.
+    """
+
+    def __init__(self, annotators=3, documents=100, tokens=300, labels=4, density=0.1, discontinuous=0.05,
+                 disagreement=0.1, files_per_dir=100, seed=0):
+        self.annotators = annotators
+        self.documents = documents
+        self.tokens = tokens
+        self.labels = labels
+        self.density = density
+        self.discontinuous = discontinuous
+        self.disagreement = disagreement
+        self.files_per_dir = files_per_dir
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def generate_text(rng, num_tokens):
+    """
+    Random lowercase words with line breaks, returns the text and the (start, end) offsets of its tokens.
+    """
+    parts, tokens, offset = [], [], 0
+    for i in range(num_tokens):
+        word = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(1, 10)))
+        separator = '\n' if i % 15 == 14 else ' '
+        tokens.append((offset, offset + len(word)))
+        parts.append(word + separator)
+        offset += len(word) + 1
+    return ''.join(parts), tokens
+
+
+def reference_entities(rng, num_tokens, spec):
+    """
+    Non-overlapping entities as (label index, [(first token, last token), ...]) with one or two fragments.
+    """
+    entities, token = [], 0
+    while token < num_tokens:
+        if rng.random() >= spec.density:
+            token += 1
+            continue
+        length = rng.randint(1, 3)
+        fragments = [(token, min(token + length, num_tokens) - 1)]
+        token = fragments[-1][1] + 1
+        if rng.random() < spec.discontinuous and token + 1 < num_tokens:
+            gap = rng.randint(1, 2)
+            start = min(token + gap, num_tokens - 1)
+            fragments.append((start, start))
+            token = start + 1
+        entities.append((rng.randrange(spec.labels), fragments))
+        token += 1  # at least one token between entities
+    return entities
+
+
+def deviate(rng, entities, num_tokens, spec):
+    """
+    One annotator's version of the reference entities.
+    """
+    annotated = []
+    for label, fragments in entities:
+        if rng.random() >= spec.disagreement:
+            annotated.append((label, fragments))
+            continue
+        deviation = rng.randrange(3)
+        if deviation == 1:  # relabel
+            annotated.append(((label + rng.randint(1, max(1, spec.labels - 1))) % spec.labels, fragments))
+        elif deviation == 2:  # shift the end of the last fragment
+            first, last = fragments[-1]
+            last = min(max(first, last + rng.choice((-1, 1))), num_tokens - 1)
+            annotated.append((label, fragments[:-1] + [(first, last)]))
+        # else: drop
+    return annotated
+
+
+def ann_content(text, tokens, entities):
+    lines = []
+    for idx, (label, fragments) in enumerate(entities, start=1):
+        spans = [(tokens[first][0], tokens[last][1]) for first, last in fragments]
+        offsets = ';'.join(f'{start} {end}' for start, end in spans)
+        covered = ' '.join(text[start:end] for start, end in spans).replace('\n', ' ')
+        lines.append(f'T{idx}\tLABEL-{label} {offsets}\t{covered}\n')
+    return ''.join(lines)
+
+
+def write(path, content):
+    with open(path, 'w', encoding='utf-8', newline='') as fout:
+        fout.write(content)
+
+
+def generate_project(root, spec=None):
+    """
+    Writes a synthetic project to root (created if necessary) and returns root. Identical specs yield identical
+    projects.
+    """
+    spec = spec or ProjectSpec()
+    os.makedirs(root, exist_ok=True)
+    sections = '\n'.join(f'LABEL-{label}' for label in range(spec.labels))
+    write(os.path.join(root, 'annotation.conf'), f'[entities]\n{sections}\n\n[relations]\n\n[events]\n\n[attributes]\n')
+    annotators = [f'annotator-{a}' for a in range(spec.annotators)]
+    rng = random.Random(spec.seed)
+    for doc in range(spec.documents):
+        rel_dir = f'batch-{doc // spec.files_per_dir}'
+        text, tokens = generate_text(rng, spec.tokens)
+        entities = reference_entities(rng, len(tokens), spec)
+        for annotator in annotators:
+            directory = os.path.join(root, annotator, rel_dir)
+            if doc % spec.files_per_dir == 0:
+                os.makedirs(directory, exist_ok=True)
+            write(os.path.join(directory, f'doc-{doc}.txt'), text)
+            write(os.path.join(directory, f'doc-{doc}.ann'),
+                  ann_content(text, tokens, deviate(rng, entities, len(tokens), spec)))
+    return root
+
+
+def add_spec_args(parser):
+    defaults = ProjectSpec()
+    for name, value in defaults.to_dict().items():
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=type(value), default=value)
+
+
+def spec_from_args(args):
+    return ProjectSpec(**{name: getattr(args, name) for name in ProjectSpec().to_dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help='Output directory')
+    add_spec_args(parser)
+    args = parser.parse_args()
+    generate_project(args.root, spec_from_args(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmarks of the hot paths of `bratiaa.agree` on a synthetic project (see `benchmarks.generate`): project scanning, ANN
+parsing, instance and token evaluation, aggregation and report rendering. Results (best and median wall time of several
+repetitions) are written as JSON and can be compared against a baseline measured on the same machine:
+
+    python -m benchmarks.run --output benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from benchmarks.generate import ProjectSpec, generate_project, add_spec_args, spec_from_args
+from bratiaa.agree import compute_f1_agreement, input_generator, iaa_report, collect_manifest
+from bratiaa.evaluation import read_instance_annotations
+from bratiaa.utils import tokenize
+
+FORMAT_VERSION = 1
+
+# benchmark defaults: small enough for `make bench` to finish within a minute
+DEFAULT_SPEC = ProjectSpec(annotators=4, documents=200, tokens=400, labels=6, density=0.15, discontinuous=0.05,
+                           disagreement=0.15)
+
+
+def bench_scan(root):
+    return lambda: sum(1 for _ in input_generator(root))
+
+
+def bench_parse(root):
+    ann_paths = [ann_file.ann_path for document in input_generator(root) for ann_file in document.ann_files]
+    return lambda: [read_instance_annotations(path) for path in ann_paths]
+
+
+def bench_agreement(**kwargs):
+    return lambda root: lambda: compute_f1_agreement(root, **kwargs)
+
+
+def bench_aggregation(root):
+    f1_agreement = compute_f1_agreement(root)
+    counts = f1_agreement._counts
+
+    def aggregate():
+        counts._invalidate()  # drop memoized marginals
+        f1_agreement.mean_sd_per_label()
+        f1_agreement.mean_sd_per_document()
+        f1_agreement.mean_sd_total()
+        f1_agreement.one_vs_rest_all(per_label=True)
+        f1_agreement.compute_total_f1_matrix()
+
+    return aggregate
+
+
+def bench_report(root):
+    f1_agreement = compute_f1_agreement(root)
+
+    def report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            iaa_report(f1_agreement)
+
+    return report
+
+
+# name -> function returning the callable to time for a project root (setup is not timed)
+BENCHMARKS = OrderedDict([
+    ('scan', bench_scan),
+    ('parse', bench_parse),
+    ('instance', bench_agreement()),
+    ('instance-bitmask', bench_agreement(engine='bitmask')),
+    ('token', bench_agreement(token_func=tokenize)),
+    ('token-bitset', bench_agreement(token_func=tokenize, engine='bitset')),
+    ('aggregation', bench_aggregation),
+    ('report', bench_report),
+])
+
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times), 'repeat': repeat}
+
+
+def run(root, names, repeat):
+    results = OrderedDict()
+    for name in names:
+        results[name] = measure(BENCHMARKS[name](root), repeat)
+        print(f'{name:<20} {results[name]["best"]:>10.4f} s (median {results[name]["median"]:.4f} s)',
+              file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints best times relative to the baseline, returns the names of benchmarks slower than (1 + tolerance) x baseline.
+    """
+    regressions = []
+    print(f'{"benchmark":<20} {"baseline":>10} {"current":>10} {"ratio":>7}')
+    for name, result in results.items():
+        if name not in baseline['results']:
+            print(f'{name:<20} {"-":>10} {result["best"]:>10.4f} {"-":>7}')
+            continue
+        reference = baseline['results'][name]['best']
+        ratio = result['best'] / reference
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<20} {reference:>10.4f} {result["best"]:>10.4f} {ratio:>7.2f}{flag}')
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--root', help='Existing project (generated in a temporary directory otherwise)')
+    parser.add_argument('--only', help='Comma-separated benchmarks (default: all)',
+                        type=lambda value: value.split(','), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Path of the JSON results')
+    parser.add_argument('--compare', help='Path of baseline JSON results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Relative slowdown against the baseline reported as regression')
+    add_spec_args(parser)
+    parser.set_defaults(**DEFAULT_SPEC.to_dict())
+    args = parser.parse_args(args)
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    spec = spec_from_args(args)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = args.root or generate_project(tmp_dir, spec)
+        num_documents = len(collect_manifest(input_generator(root)))
+        results = run(root, args.only, args.repeat)
+
+    output = OrderedDict([
+        ('format_version', FORMAT_VERSION),
+        ('project', spec.to_dict() if not args.root else {'root': args.root, 'documents': num_documents}),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('results', results),
+    ])
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(output, fout, indent=2)
+    if args.compare:
+        with open(args.compare) as fin:
+            baseline = json.load(fin)
+        if baseline.get('project') != output['project']:
+            print('Warning: baseline was measured on a different project', file=sys.stderr)
+        for key in ('python', 'numpy'):
+            if baseline.get(key) != output[key]:
+                print(f'Warning: baseline was measured with {key} {baseline.get(key)}', file=sys.stderr)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
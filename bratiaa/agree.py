@@ -1,16 +1,22 @@
-import logging
-from itertools import combinations
+import io
+import os
+from collections import namedtuple
+from itertools import combinations, chain
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
 from functools import partial
-from scipy.special import comb
-from tabulate import tabulate
 
+from bratiaa.cache import CountCache
+from bratiaa.counts import create_counts, StreamingCounts
+from bratiaa.engines import get_engine, label_indices, _get_label
 from bratiaa.evaluation import *
-from bratiaa.utils import read, TokenOverlap
-from bratsubset.projectconfig import ProjectConfiguration
+from bratiaa.labels import read_entity_types
+from bratiaa.profiling import Profile, stage
+from bratiaa.progress import Progress
+from bratiaa.sampling import StratifiedSample, bootstrap_estimate
+from bratiaa.scan import list_subdirectories, scan_ann_files
+from bratiaa.utils import tokenize, TokenOverlap, ENCODING
 
 # attempted division by zero is expected and unproblematic -> NaN
 np.seterr(divide='ignore', invalid='ignore')
@@ -30,37 +36,47 @@ class Document:
         self.ann_files = []
 
 
-def input_generator(root):
+def input_generator(root, threads=None):
     """
     Yields Document objects. Assumes that each first-level subdirectory of the
-    annotation project corresponds to one annotator.
+    annotation project corresponds to one annotator (hidden directories are ignored).
+
+    All annotator directories are scanned in one pass (see `bratiaa.scan.scan_ann_files`). As before, ANN paths are
+    `pathlib.Path` objects and text paths POSIX strings.
     """
     root = Path(root)
-    annotators = [subdir.parts[-1] for subdir in root.glob('*/') if subdir.is_dir()]
+    annotator_dirs = {annotator: root / annotator for annotator in list_subdirectories(os.fspath(root))}
+    annotators = list(annotator_dirs)
     assert len(annotators) > 1, 'At least two annotators are necessary to compute agreement!'
-    for rel_path in sorted(collect_redundant_files(root, annotators)):
-        document = Document((root / annotators[0] / rel_path).as_posix()[:-3] + 'txt', doc_id=rel_path)
-        for annotator in annotators:
-            ann_path = root / annotator / rel_path
-            document.ann_files.append(AnnFile(annotator, ann_path))
+    for rel_path in sorted(collect_redundant_files(os.fspath(root), annotators, threads=threads)):
+        document = Document((annotator_dirs[annotators[0]] / rel_path).as_posix()[:-3] + 'txt', doc_id=rel_path)
+        document.ann_files = [AnnFile(annotator, directory / rel_path)
+                              for annotator, directory in annotator_dirs.items()]
         yield document
 
 
-def collect_redundant_files(root, annotators):
-    intersection = None
-    for annotator in annotators:
-        subdir_path = root / annotator
-        relative_paths = {path.relative_to(subdir_path).as_posix() for path in subdir_path.glob('**/*.ann')}
-        if not intersection:
-            intersection = relative_paths
-        else:
-            intersection = intersection.intersection(relative_paths)
-    return intersection
+def collect_redundant_files(root, annotators, threads=None):
+    """
+    Relative paths of the ANN files present in the directories of all given annotators.
+    """
+    directories = [os.path.join(root, annotator) for annotator in annotators]
+    rel_paths = scan_ann_files(directories, threads=threads)
+    return set.intersection(*(set(rel_paths[directory]) for directory in directories))
+
+
+def collect_manifest(input_gen):
+    """
+    Materializes the documents of an input generator (a callable returning Document objects or an iterable of them)
+    with a single traversal, such that discovery and evaluation do not scan the project twice.
+    """
+    if callable(input_gen):
+        input_gen = input_gen()
+    return list(input_gen)
 
 
-def _collect_annotators_and_documents(input_gen):
+def _collect_annotators_and_documents(manifest):
     annotators, documents = set(), []
-    for document in input_gen():
+    for document in manifest:
         for ann_file in document.ann_files:
             annotators.add(ann_file.annotator_id)
         documents.append(document.doc_id)
@@ -71,30 +87,345 @@ def compute_f1(tp, total):
     return (2 * tp) / total
 
 
+class _DocumentInputs:
+    """
+    Reads the text-bound annotations and tokenizations of a document at most once, shared by all modes. Counts the
+    files and bytes it reads (for progress and profile), without extra metadata calls.
+    """
+
+    def __init__(self, document, token_cache=None, profile=None):
+        self.document = document
+        self._token_cache = token_cache
+        self._profile = profile
+        self._textbounds = {}
+        self._text = None
+        self._token_overlaps = {}
+        self.files_read = 0
+        self.bytes_read = 0
+
+    def _read_bytes(self, path):
+        with open(path, mode='rb') as fin:
+            data = fin.read()
+        self.bytes_read += len(data)
+        return data
+
+    def textbounds(self, indices):
+        """
+        Text-bound annotations of the ANN files at given indices (dict index -> list).
+        """
+        bytes_before = self.bytes_read
+        for i in indices:
+            if i not in self._textbounds:
+                data = self._read_bytes(self.document.ann_files[i].ann_path)
+                self.files_read += 1
+                # universal newlines, as when reading the file in text mode
+                self._textbounds[i] = list(parse_textbounds(io.StringIO(data.decode('utf-8'), newline=None)))
+        if self._profile and self.bytes_read > bytes_before:
+            self._profile.add('parse', bytes_read=self.bytes_read - bytes_before)
+        return {i: self._textbounds[i] for i in indices}
+
+    def ann_paths(self, indices):
+        """
+        Paths of the ANN files at given indices (dict index -> path) for parse functions reading them themselves, whose
+        sizes are counted as read.
+        """
+        sources = {i: self.document.ann_files[i].ann_path for i in indices}
+        size = sum(os.path.getsize(path) for path in sources.values())
+        self.files_read += len(sources)
+        self.bytes_read += size
+        if self._profile:
+            self._profile.add('parse', bytes_read=size)
+        return sources
+
+    def token_overlap(self, token_func):
+        if token_func not in self._token_overlaps:
+            with stage(self._profile, 'tokenize'):
+                if self._text is None:
+                    # no newline translation, as `bratiaa.utils.read`
+                    data = self._read_bytes(self.document.txt_path)
+                    self._text = data.decode(ENCODING)
+                    if self._profile:
+                        self._profile.add('tokenize', bytes_read=len(data))
+                if self._token_cache:
+                    to = self._token_cache.token_overlap(self._text, token_func)
+                else:
+                    to = TokenOverlap(self._text, list(token_func(self._text)))
+            self._token_overlaps[token_func] = to
+        return self._token_overlaps[token_func]
+
+
+class _DocumentEvaluator:
+    """
+    Computes the (pair, count, label) counts of single documents for one or more modes, i.e. (evaluation, engine,
+    token function) tuples. Separate from F1Agreement, such that it can be sent to worker processes.
+
+    Only the annotator pairs in pair2idx are evaluated. Unless an engine is used, ANN files of annotators without any
+    of these pairs are not parsed.
+    """
+
+    def __init__(self, modes, pair2idx, label2idx, cache=None, token_cache=None, profile=None, annotators=None):
+        self._modes = list(modes)
+        self._pair2idx = pair2idx
+        # annotators of the layout (other annotators are errors, not just excluded from evaluation)
+        self._annotators = set(annotators) if annotators is not None else {a for pair in pair2idx for a in pair}
+        self._label2idx = label2idx
+        self._num_pairs = len(set(pair2idx.values()))
+        self._cache = cache
+        if cache:
+            self._cache_namespaces = [cache.namespace(evaluation, token_func, label2idx)
+                                      for evaluation, _, token_func in self._modes]
+        self._token_cache = token_cache
+        self._profile = profile  # `bratiaa.profiling.Profile` or None
+
+    @property
+    def caches(self):
+        return [self._cache, self._token_cache]
+
+    def __call__(self, document):
+        """
+        Returns one (pair, count, label) array per mode and the number of files and bytes read (none for documents
+        answered by the count cache).
+        """
+        document_pairs, pair_indices = self._select_pairs(document)
+        inputs = _DocumentInputs(document, self._token_cache, self._profile)
+        results = []
+        for mode_idx, (evaluation, engine, token_func) in enumerate(self._modes):
+            counts, key = None, None
+            if self._cache:
+                with stage(self._profile, 'cache'):
+                    key = self._cache.document_key(self._cache_namespaces[mode_idx], document,
+                                                   with_text=bool(token_func), pairs=document_pairs)
+                    counts = self._cache.load(key)
+            if counts is None:
+                counts = self._evaluate(inputs, evaluation, engine, token_func, document_pairs)
+                if key:
+                    with stage(self._profile, 'cache'):
+                        self._cache.store(key, counts)
+            pcl = np.zeros((self._num_pairs, 2, len(self._label2idx)), dtype=np.int64)
+            pcl[pair_indices] = counts
+            results.append(pcl)
+        return results, (inputs.files_read, inputs.bytes_read)
+
+    def _select_pairs(self, document):
+        """
+        Positions (in `combinations(document.ann_files, 2)`) of the document's annotator pairs to evaluate (None: all)
+        and their pair indices.
+        """
+        pair_indices = [self._pair2idx.get((ann_file_1.annotator_id, ann_file_2.annotator_id))
+                        for ann_file_1, ann_file_2 in combinations(document.ann_files, 2)]
+        if None not in pair_indices:
+            return None, pair_indices
+        for ann_file in document.ann_files:
+            if ann_file.annotator_id not in self._annotators:
+                raise KeyError(ann_file.annotator_id)
+        positions = [position for position, pair_idx in enumerate(pair_indices) if pair_idx is not None]
+        return positions, [pair_indices[position] for position in positions]
+
+    def _evaluate(self, inputs, evaluation, engine, token_func, document_pairs=None):
+        """
+        Counts of the annotator pairs of the document at given positions of `combinations(document.ann_files, 2)`
+        (None: all pairs), in that order.
+        """
+        to = inputs.token_overlap(token_func) if token_func else None
+        parse = engine.parse if engine else evaluation.parse
+        ann_files = inputs.document.ann_files
+        index_pairs = list(combinations(range(len(ann_files)), 2))
+        if document_pairs is not None:
+            index_pairs = [index_pairs[position] for position in document_pairs]
+        needed = (range(len(ann_files)) if engine or document_pairs is None
+                  else {i for pair in index_pairs for i in pair})
+        with stage(self._profile, 'parse'):
+            if parse in TEXTBOUND_PARSERS:
+                sources = inputs.textbounds(needed)
+            else:
+                sources = inputs.ann_paths(needed)
+            parsed = {i: parse(source, tokens=to) for i, source in sources.items()}
+        with stage(self._profile, 'compare'):
+            if engine:
+                counts = engine.counts([parsed[i] for i in range(len(ann_files))], self._label2idx)
+                return counts if document_pairs is None else counts[document_pairs]
+            ann_pairs = [(parsed[i], parsed[j]) for i, j in index_pairs]
+            counts = np.zeros((len(ann_pairs), 2, len(self._label2idx)), dtype=np.int64)
+            for cl, (ann_1, ann_2) in zip(counts, ann_pairs):
+                tp, exp, pred = evaluation.compare(ann_1, ann_2, tokens=to)
+                self._increment_counts(tp, cl[0])
+                self._increment_counts(chain(exp, pred), cl[1])
+            return counts
+
+    def evaluate_chunk(self, documents):
+        """
+        Returns the counts and reads of all given documents (see `__call__`), the (hits, misses) they caused for each of
+        `caches` and the stages they added to the profile (None without profile).
+        """
+        before = [cache.stats() if cache else (0, 0) for cache in self.caches]
+        profile = self._profile
+        if profile:
+            self._profile = Profile()
+        counts = [self(document) for document in documents]
+        stats = [(cache.hits - hits, cache.misses - misses) if cache else (0, 0)
+                 for cache, (hits, misses) in zip(self.caches, before)]
+        chunk_profile, self._profile = self._profile, profile
+        return counts, stats, chunk_profile.to_dict() if chunk_profile else None
+
+    def _increment_counts(self, annotations, counts):
+        """
+        Maps the annotations' labels to label indices in bulk and adds them with a single `np.bincount`.
+        """
+        indices = label_indices(map(_get_label, annotations), self._label2idx)
+        counts += np.bincount(indices, minlength=len(counts))
+
+
+def _evaluate_in_parallel(evaluator, documents, n_jobs, chunks_per_job=4):
+    """
+    Evaluates chunks of documents in a process pool, yielding (document, counts) in input order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    documents = list(documents)
+    chunk_size = max(1, -(-len(documents) // (n_jobs * chunks_per_job)))
+    chunks = [documents[i:i + chunk_size] for i in range(0, len(documents), chunk_size)]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for chunk, (counts, stats, profile) in zip(chunks, executor.map(evaluator.evaluate_chunk, chunks)):
+            for cache, (hits, misses) in zip(evaluator.caches, stats):
+                if cache:  # workers operate on copies of the caches
+                    cache.hits += hits
+                    cache.misses += misses
+            if profile:  # likewise the profile
+                evaluator._profile.merge(profile)
+            yield from zip(chunk, counts)
+
+
 class F1Agreement:
     def __init__(self, input_gen, labels, eval_func=exact_match_instance_evaluation, token_func=None, annotators=None,
-                 documents=None):
+                 documents=None, n_jobs=1, storage='auto', cache=None, engine='pairwise', token_cache=None,
+                 profile=None, progress=None, reference=None, pairs=None, sample_pairs=None, seed=None):
+        """
+        The input generator is either a callable returning Document objects or an iterable of them. Unless annotators
+        and documents are given, it is traversed only once (see `collect_manifest`).
+
+        With n_jobs > 1, documents are evaluated in a pool of worker processes (n_jobs < 1: one per CPU). Eval and
+        token functions then need to be picklable, i.e., defined at module level.
+
+        Counts are stored in a dense, sparse or streaming backend (see `bratiaa.counts.create_counts`). Streaming
+        storage keeps no per-document counts (no per-document table, saving or merging), its memory does not grow with
+        the number of documents. Per-document counts are reused from and written to the given
+        `bratiaa.cache.CountCache`, tokenizations to the given `bratiaa.cache.TokenCache`.
+
+        The engines 'bitmask' (instance-based) and 'bitset' (token-based) compute the counts of all annotator pairs of a
+        document at once (see `bratiaa.engines`), the default 'pairwise' compares each pair with the eval function.
+
+        Wall time, calls, bytes read and documents per stage are recorded in the given `bratiaa.profiling.Profile`. The
+        progress callback is called with a `bratiaa.progress.Progress` before the first and after each document.
+
+        Given a reference annotator (e.g. adjudicated gold annotations), only the pairs of each other annotator with the
+        reference are evaluated and stored, instead of all 2-combinations of annotators. Likewise, evaluation can be
+        restricted to an explicit list of annotator pairs and/or to a random sample of sample_pairs pairs (see
+        `select_pairs`), statistics are then marked as sampled in the report.
+        """
         if not (annotators and documents):
+            input_gen = _scan(input_gen, profile)
             annotators, documents = _collect_annotators_and_documents(input_gen)
             annotators.sort()
             documents.sort()
         assert len(annotators) > 1, 'At least two annotators are necessary to compute agreement!'
-        num_pairs = comb(len(annotators), 2, exact=True)
-        # (p, d, c, l) where p := annotator pairs, d := documents, c := counts (tp, total = 2*tp+fp+fn), l := labels
-        self._pdcl = np.zeros((num_pairs, len(documents), 2, len(labels)))
+        self._init_layout(annotators, documents, labels, pairs=pairs, storage=storage, reference=reference,
+                          sample_pairs=sample_pairs, seed=seed)
+        self._configure(eval_func, token_func, n_jobs=n_jobs, cache=cache, engine=engine, token_cache=token_cache,
+                        profile=profile, progress=progress)
+        self._compute_tp_total(input_gen)
+
+    def _configure(self, eval_func, token_func, n_jobs=1, cache=None, engine='pairwise', token_cache=None,
+                   profile=None, progress=None):
+        self._eval_func = eval_func  # function used to extract true positives, false positives and false negatives
+        self._evaluation = as_evaluation(eval_func)  # parses each ANN file once per document
+        self._engine = get_engine(engine, self._evaluation)
+        self._token_func = token_func  # function used for tokenization
+        self._n_jobs = n_jobs if n_jobs >= 1 else os.cpu_count()
+        self._cache = cache
+        self._token_cache = token_cache
+        self._profile = profile
+        self._progress = progress
+        self._token_based = token_func is not None
+
+    def _init_layout(self, annotators, documents, labels, pairs=None, storage='auto', reference=None,
+                     sample_pairs=None, seed=None):
+        """
+        Sets up indexes and empty counts. Pairs default to all 2-combinations of annotators or, given a reference
+        annotator, to the pairs of each other annotator with the reference (see `select_pairs`).
+        """
+        pairs, self._sampled_from = select_pairs(annotators, pairs, reference, sample_pairs, seed)
+        self._reference = reference
+        self._estimate = None  # see `_compute_sampled`
+        self._seed = seed if self._sampled_from else None
         self._documents = list(documents)
         self._doc2idx = {d: i for i, d in enumerate(documents)}
         self._labels = list(labels)
         self._label2idx = {l: i for i, l in enumerate(labels)}
         self._annotators = list(annotators)
-        self._pairs = [pair for pair in combinations(annotators, 2)]
+        self._pairs = pairs
         self._pair2idx = {p: i for i, p in enumerate(self._pairs)}
         # add pairs in reverse order (same index)
         for (a1, a2), value in self._pair2idx.copy().items():
             self._pair2idx[(a2, a1)] = value
-        self._eval_func = eval_func  # function used to extract true positives, false positives and false negatives
-        self._token_func = token_func  # function used for tokenization
-        self._compute_tp_total(input_gen)
+        # (a, p) where p involves annotator a
+        self._annotator2idx = {a: i for i, a in enumerate(self._annotators)}
+        self._involved = np.zeros((len(self._annotators), len(self._pairs)), dtype=bool)
+        for pair_idx, (a1, a2) in enumerate(self._pairs):
+            self._involved[[self._annotator2idx[a1], self._annotator2idx[a2]], pair_idx] = True
+        # (p, d, c, l) where p := annotator pairs, d := documents, c := counts (tp, total = 2*tp+fp+fn), l := labels
+        self._counts = create_counts(len(self._pairs), len(self._documents), len(self._labels), storage=storage)
+
+    @classmethod
+    def _from_layout(cls, annotators, documents, labels, token_based, pairs=None, storage='auto', reference=None,
+                     sample_pairs=None, seed=None):
+        """
+        Empty agreement without evaluation (for loading and merging).
+        """
+        f1_agreement = cls.__new__(cls)
+        f1_agreement._init_layout(annotators, documents, labels, pairs=pairs, storage=storage, reference=reference,
+                                  sample_pairs=sample_pairs, seed=seed)
+        f1_agreement._eval_func = f1_agreement._evaluation = f1_agreement._token_func = f1_agreement._cache = None
+        f1_agreement._engine = f1_agreement._token_cache = f1_agreement._profile = f1_agreement._progress = None
+        f1_agreement._n_jobs = 1
+        f1_agreement._token_based = token_based
+        return f1_agreement
+
+    def save(self, path):
+        """
+        Saves indexes and non-zero counts as compressed NPZ file, e.g. to merge shards computed on different machines.
+        """
+        indices, values = self._counts.entries()
+        np.savez_compressed(path,
+                            format_version=np.array(1),
+                            annotators=np.array(self._annotators, dtype=str),
+                            documents=np.array(self._documents, dtype=str),
+                            labels=np.array(self._labels, dtype=str),
+                            pairs=np.array([(self._annotator2idx[a1], self._annotator2idx[a2])
+                                            for a1, a2 in self._pairs], dtype=np.int32).reshape(-1, 2),
+                            token_based=np.array(self._token_based),
+                            reference=np.array(self._reference or ''),
+                            sampled_from=np.array(self._sampled_from or 0),
+                            seed=np.array(-1 if self._seed is None else self._seed),
+                            indices=np.array(indices, dtype=np.int32).reshape(4, -1),
+                            values=np.array(values, dtype=np.int32))
+
+    @classmethod
+    def load(cls, path, storage='auto'):
+        """
+        Loads an agreement saved with `save`. Reporting works as usual, the loaded agreement cannot be re-evaluated.
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            annotators = npz['annotators'].tolist()
+            reference = str(npz['reference']) if 'reference' in npz.files else ''
+            f1_agreement = cls._from_layout(annotators, npz['documents'].tolist(), npz['labels'].tolist(),
+                                            bool(npz['token_based']),
+                                            pairs=[(annotators[i], annotators[j]) for i, j in npz['pairs']],
+                                            storage=storage, reference=reference or None)
+            if 'sampled_from' in npz.files:
+                f1_agreement._sampled_from = int(npz['sampled_from']) or None
+                f1_agreement._seed = int(npz['seed']) if int(npz['seed']) >= 0 else None
+            f1_agreement._counts.add_entries(npz['indices'], npz['values'])
+        return f1_agreement
 
     @property
     def annotators(self):
@@ -108,39 +439,67 @@ class F1Agreement:
     def labels(self):
         return list(self._labels)
 
+    @property
+    def reference(self):
+        return self._reference
+
+    @property
+    def pairs(self):
+        return list(self._pairs)
+
+    @property
+    def estimate(self):
+        """
+        `bratiaa.sampling.Estimate` of the agreement of all documents if only a sample was evaluated (None otherwise).
+        """
+        return self._estimate
+
+    @property
+    def streaming(self):
+        """
+        Whether counts are only kept as running sums over documents (storage='streaming').
+        """
+        return isinstance(self._counts, StreamingCounts)
+
+    @property
+    def sampled_from(self):
+        """
+        Number of candidate pairs the evaluated pairs were randomly drawn from (None: not sampled).
+        """
+        return self._sampled_from
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def token_cache(self):
+        return self._token_cache
+
+    @property
+    def profile(self):
+        return self._profile
+
+    @property
+    def _pdcl(self):
+        """
+        Dense (pair, document, count, label) tensor (read-only for dense storage).
+        """
+        return self._counts.to_dense()
+
     def _compute_tp_total(self, input_gen):
-        for doc_index, document in enumerate(input_gen()):
+        _compute_tp_totals([self], input_gen)
+
+    def _check_document_count(self, documents):
+        for doc_index, document in enumerate(documents):
             assert doc_index < len(self._documents), 'Input generator yields more documents than expected!'
-            to = None
-            if self._token_func:
-                text = read(document.txt_path)
-                tokens = list(self._token_func(text))
-                to = TokenOverlap(text, tokens)
-            for anno_file_1, anno_file_2 in combinations(document.ann_files, 2):
-                tp, exp, pred = self._eval_func(anno_file_1.ann_path, anno_file_2.ann_path, tokens=to)
-                pair_idx = self._pair2idx[(anno_file_1.annotator_id, anno_file_2.annotator_id)]
-                doc_idx = self._doc2idx[document.doc_id]
-                self._increment_counts(tp, pair_idx, doc_idx, 0)
-                self._increment_counts(exp, pair_idx, doc_idx, 1)
-                self._increment_counts(pred, pair_idx, doc_idx, 1)
-
-    def _increment_counts(self, annotations, pair, doc, kind):
-        for a in annotations:
-            try:
-                self._pdcl[pair][doc][kind][self._label2idx[a.label]] += 1
-            except KeyError:
-                logging.error(
-                    f'Encountered unknown label "{a.label}"! Please make sure that your "annotation.conf" '
-                    f'(https://brat.nlplab.org/configuration.html#annotation-configuration) '
-                    f'is located under the project root and contains an exhaustive list of entities!'
-                )
-                raise
+            yield document
 
     def mean_sd_per_label(self):
         """
         Mean and standard deviation of all annotator combinations' F1 scores by label.
         """
-        pcl = np.sum(self._pdcl, axis=1)  # sum over documents
+        pcl = self._counts.sum_documents()
         f1_pairs = compute_f1(pcl[:, 0], pcl[:, 1])
         avg, stddev = self._mean_sd(f1_pairs)
         return avg, stddev
@@ -149,16 +508,29 @@ class F1Agreement:
         """
         Mean and standard deviation of all annotator combinations' F1 scores per document.
         """
-        pdc = np.sum(self._pdcl, axis=3)  # sum over labels
+        pdc = self._counts.sum_labels()
         f1_pairs = compute_f1(pdc[:, :, 0], pdc[:, :, 1])
         avg, stddev = self._mean_sd(f1_pairs)
         return avg, stddev
 
+    def mean_sd_documents(self):
+        """
+        Mean and standard deviation of the per-document F1 scores of all annotator combinations (documents without
+        annotations of a pair are skipped). Unlike `mean_sd_per_document`, also available with streaming storage.
+        """
+        count, mean, m2 = self._counts.document_f1_moments().T
+        num_scores = count.sum()
+        mean = np.where(count > 0, mean, 0)
+        avg = (count * mean).sum() / num_scores
+        # pooled sum of squared deviations (Chan et al.)
+        stddev = np.sqrt((m2.sum() + (count * (mean - avg) ** 2).sum()) / num_scores)
+        return avg, stddev
+
     def mean_sd_total(self):
         """
         Mean and standard deviation of all annotator cominations' F1 scores.
         """
-        pc = np.sum(self._pdcl, axis=(1, 3))  # sum over documents and labels
+        pc = self._counts.sum_documents_labels()
         f1_pairs = compute_f1(pc[:, 0], pc[:, 1])
         avg, stddev = self._mean_sd(f1_pairs)
         return avg, stddev
@@ -167,7 +539,7 @@ class F1Agreement:
         """
         Mean and standard deviation of all annotator combinations' F1 scores involving given annotator per label.
         """
-        pcl = np.sum(self._pdcl, axis=1)  # sum over documents
+        pcl = self._counts.sum_documents()
         pcl = pcl[self._pairs_involving(annotator)]
         f1_pairs = compute_f1(pcl[:, 0], pcl[:, 1])
         avg, stddev = self._mean_sd(f1_pairs)
@@ -177,7 +549,7 @@ class F1Agreement:
         """
         Mean and standard deviation of all annotator combinations' F1 scores involving given annotator.
         """
-        pc = np.sum(self._pdcl, axis=(1, 3))  # sum over documents and labels
+        pc = self._counts.sum_documents_labels()
         pc = pc[self._pairs_involving(annotator)]
         f1_pairs = compute_f1(pc[:, 0], pc[:, 1])
         if len(f1_pairs) > 1:
@@ -186,9 +558,31 @@ class F1Agreement:
             avg, stddev = f1_pairs, 0
         return avg, stddev
 
+    def one_vs_rest_all(self, per_label=False):
+        """
+        Mean and standard deviation of the F1 scores of all annotator combinations involving each annotator (rows in
+        the order of `annotators`), in total or per label. Same as `mean_sd_total_one_vs_rest` and
+        `mean_sd_per_label_one_vs_rest` for every annotator, but from a single reduction.
+        """
+        if per_label:
+            pcl = self._counts.sum_documents()
+            f1_pairs = compute_f1(pcl[:, 0], pcl[:, 1])
+        else:
+            pc = self._counts.sum_documents_labels()
+            f1_pairs = compute_f1(pc[:, 0], pc[:, 1])[:, None]
+        # (a, p, l) with pairs not involving the annotator masked out
+        involved = self._involved[:, :, None]
+        num_pairs = involved.sum(axis=1)
+        avg = np.where(involved, f1_pairs, 0).sum(axis=1) / num_pairs
+        stddev = np.sqrt(np.where(involved, (f1_pairs - avg[:, None]) ** 2, 0).sum(axis=1) / num_pairs)
+        if per_label:
+            return avg, stddev
+        return avg[:, 0], stddev[:, 0]
+
     def _pairs_involving(self, annotator):
-        return [self._pair2idx[(a1, a2)] for (a1, a2) in self._pairs if
-                a1 == annotator or a2 == annotator]
+        if annotator not in self._annotator2idx:
+            return np.zeros(0, dtype=np.intp)
+        return np.flatnonzero(self._involved[self._annotator2idx[annotator]])
 
     @staticmethod
     def _mean_sd(f1_pairs):
@@ -201,6 +595,8 @@ class F1Agreement:
 
     @staticmethod
     def print_table(row_label_header, row_labels, avg, stddev, precision=3):
+        from tabulate import tabulate
+
         stats = np.stack((row_labels, avg, stddev)).transpose()
         headers = [row_label_header, 'Mean F1', 'SD F1']
         print(tabulate(stats, headers=headers, tablefmt='github', floatfmt=f'.{precision}f'))
@@ -210,15 +606,15 @@ class F1Agreement:
         Returns (n x n) matrix, where n is the number of annotators, containing
         pair-wise total F1 scores between all annotators.
 
-        By definition, the matrix is symmetric and F1 = 1 on the main diagonal.
+        By definition, the matrix is symmetric and F1 = 1 on the main diagonal. Pairs that are not evaluated (e.g.
+        two annotators compared with a reference annotator only) are NaN.
         """
-        pc = np.sum(self._pdcl, axis=(1, 3))  # sum over documents and labels
+        pc = self._counts.sum_documents_labels()
         f1_pairs = compute_f1(pc[:, 0], pc[:, 1])
         num_annotators = len(self._annotators)
-        f1_matrix = np.zeros((num_annotators, num_annotators))
-        annotator2idx = {a: i for i, a in enumerate(self._annotators)}
+        f1_matrix = np.full((num_annotators, num_annotators), np.nan)  # NaN: pair not evaluated
         for ann1, ann2 in self._pairs:
-            ann1_idx, ann2_idx = annotator2idx[ann1], annotator2idx[ann2]
+            ann1_idx, ann2_idx = self._annotator2idx[ann1], self._annotator2idx[ann2]
             f1_matrix[ann1_idx][ann2_idx] = f1_pairs[self._pair2idx[(ann1, ann2)]]
             f1_matrix[ann2_idx][ann1_idx] = f1_pairs[self._pair2idx[(ann2, ann1)]]
         # perfect diagonal by definition
@@ -230,6 +626,12 @@ class F1Agreement:
         """
         Draws heatmap based on square matrix of F1 scores.
         """
+        with stage(self._profile, 'heatmap'):
+            self._draw_heatmap(out_path)
+
+    def _draw_heatmap(self, out_path):
+        import matplotlib.pyplot as plt  # slow import, only needed here
+
         matrix = self.compute_total_f1_matrix()
         fig, ax = plt.subplots()
         im = ax.imshow(matrix)
@@ -246,7 +648,8 @@ class F1Agreement:
                  rotation_mode="anchor")
         for i in range(len(self._annotators)):
             for j in range(len(self._annotators)):
-                ax.text(j, i, f'{matrix[i, j]:.2f}', ha="center", va="center", color="w")
+                text = '-' if np.isnan(matrix[i, j]) else f'{matrix[i, j]:.2f}'
+                ax.text(j, i, text, ha="center", va="center", color="w")
 
         # color bar
         cbar = ax.figure.colorbar(im, ax=ax)
@@ -256,25 +659,297 @@ class F1Agreement:
         plt.savefig(out_path)
 
 
-def compute_f1_agreement(project_root, input_gen=input_generator, token_func=None, eval_func=None):
-    if not eval_func:
-        eval_func = exact_match_instance_evaluation
-        if token_func:
-            eval_func = exact_match_token_evaluation
+def _compute_tp_totals(agreements, input_gen):
+    """
+    Fills the counts of agreements with identical layout but different modes in a single pass over the documents.
+    """
+    first = agreements[0]
+    profile = first._profile
+    evaluator = _DocumentEvaluator([(a._evaluation, a._engine, a._token_func) for a in agreements], first._pair2idx,
+                                   first._label2idx, cache=first._cache, token_cache=first._token_cache,
+                                   profile=profile, annotators=first._annotators)
+    documents = first._check_document_count(input_gen() if callable(input_gen) else input_gen)
+    if first._n_jobs > 1:
+        results = _evaluate_in_parallel(evaluator, documents, first._n_jobs)
+    else:
+        results = ((document, evaluator(document)) for document in documents)
+    progress = first._progress
+    if progress:
+        documents_done, files_parsed, bytes_read = 0, 0, 0
+        progress(Progress(0, len(first._documents), 0, 0))
+    for document, (counts, (files_read, document_bytes)) in results:
+        with stage(profile, 'accumulate'):
+            doc_idx = first._doc2idx[document.doc_id]
+            for agreement, pcl in zip(agreements, counts):
+                agreement._counts.add(doc_idx, pcl)
+        if profile:
+            profile.add('accumulate', documents=1)
+        if progress:
+            documents_done += 1
+            files_parsed += files_read
+            bytes_read += document_bytes
+            progress(Progress(documents_done, len(first._documents), files_parsed, bytes_read))
+
+
+def _project_input_gen(input_gen, project_root, threads=None):
+    if threads is None:  # custom input generators need not support threads
+        return partial(input_gen, project_root)
+    return partial(input_gen, project_root, threads=threads)
+
+
+def _scan(input_gen, profile=None):
+    with stage(profile, 'scan'):
+        manifest = collect_manifest(input_gen)
+    if profile:
+        profile.add('scan', documents=len(manifest))
+    return manifest
+
+
+def _read_labels(project_root, profile=None):
+    with stage(profile, 'config'):
+        return sorted(read_entity_types(project_root))
+
+
+def _default_eval_func(eval_func, token_func):
+    if eval_func:
+        return eval_func
+    if token_func:
+        return exact_match_token_evaluation
+    return exact_match_instance_evaluation
+
+
+def reference_pairs(annotators, reference):
+    """
+    Pairs of each annotator with the reference annotator.
+    """
+    if reference not in annotators:
+        raise ValueError(f'Unknown reference annotator "{reference}"! Expected one of: {", ".join(annotators)}.')
+    return [(reference, annotator) for annotator in annotators if annotator != reference]
 
-    config = ProjectConfiguration(project_root)
-    labels = config.get_entity_types()
-    input_gen = partial(input_gen, project_root)
-    annotators, documents = _collect_annotators_and_documents(input_gen)
 
-    return F1Agreement(input_gen, sorted(labels), eval_func=eval_func, token_func=token_func,
-                       annotators=sorted(annotators),
-                       documents=sorted(documents))
+def select_pairs(annotators, pairs=None, reference=None, sample_pairs=None, seed=None):
+    """
+    Annotator pairs to evaluate and the number of candidate pairs they were sampled from (None: not sampled).
+
+    Candidates are the given pairs (each involving the reference annotator, if any), the pairs with the reference
+    annotator or all 2-combinations of annotators. With sample_pairs=k, k candidates are drawn uniformly at random
+    without replacement (reproducible given the seed), keeping their order.
+    """
+    if pairs is not None:
+        candidates = _check_pairs(annotators, pairs, reference)
+    elif reference is not None:
+        candidates = reference_pairs(annotators, reference)
+    else:
+        candidates = list(combinations(annotators, 2))
+    if sample_pairs is None or sample_pairs >= len(candidates):
+        return candidates, None
+    if sample_pairs < 1:
+        raise ValueError(f'Cannot sample {sample_pairs} annotator pairs!')
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(candidates), size=sample_pairs, replace=False))
+    return [candidates[i] for i in sample], len(candidates)
+
+
+def _check_pairs(annotators, pairs, reference):
+    known, checked, seen = set(annotators), [], set()
+    for a1, a2 in pairs:
+        if a1 not in known or a2 not in known:
+            raise ValueError(f'Unknown annotator in pair ({a1}, {a2})! Expected one of: {", ".join(annotators)}.')
+        if a1 == a2:
+            raise ValueError(f'Cannot compare annotator {a1} with itself!')
+        if reference is not None and reference not in (a1, a2):
+            raise ValueError(f'Pair ({a1}, {a2}) does not involve the reference annotator {reference}!')
+        if frozenset((a1, a2)) in seen:
+            raise ValueError(f'Duplicate pair ({a1}, {a2})!')
+        seen.add(frozenset((a1, a2)))
+        checked.append((a1, a2))
+    if not checked:
+        raise ValueError('At least one annotator pair is necessary to compute agreement!')
+    return checked
+
+
+def compute_f1_agreement(project_root, input_gen=input_generator, token_func=None, eval_func=None, n_jobs=1,
+                         storage='auto', cache_dir=None, engine='pairwise', token_cache=None, profile=None,
+                         progress=None, reference=None, pairs=None, sample_pairs=None, seed=None, sampling=None,
+                         scan_threads=None):
+    """
+    Computes the agreement of a project. Given a `bratiaa.sampling.Sampling`, only a stratified random sample of the
+    documents is evaluated (see `_compute_sampled`) and the agreement carries an estimate with confidence intervals.
+    With scan_threads, the project is scanned by that many threads (see `input_generator`), e.g. on network file
+    systems.
+    """
+    _check_sampling(sampling, storage)
+    eval_func = _default_eval_func(eval_func, token_func)
+    labels = _read_labels(project_root, profile)
+    manifest = _scan(_project_input_gen(input_gen, project_root, scan_threads), profile)
+    annotators, documents = _collect_annotators_and_documents(manifest)
+    cache = CountCache(cache_dir) if cache_dir else None
+
+    def evaluate(part, pairs=pairs, sample_pairs=sample_pairs, progress=progress):
+        return F1Agreement(part, labels, eval_func=eval_func, token_func=token_func,
+                           annotators=sorted(annotators),
+                           documents=sorted(document.doc_id for document in part), n_jobs=n_jobs, storage=storage,
+                           cache=cache, engine=engine, token_cache=token_cache,
+                           profile=profile, progress=progress, reference=reference, pairs=pairs,
+                           sample_pairs=sample_pairs, seed=seed)
+
+    if sampling is None:
+        return evaluate(manifest)
+    # all batches share the (sampled) pairs
+    pairs, sampled_from = select_pairs(sorted(annotators), pairs, reference, sample_pairs, seed)
+    agreement = _compute_sampled(manifest, sampling,
+                                 lambda part, progress: {'agreement': evaluate(part, pairs, None, progress)},
+                                 profile, progress)['agreement']
+    agreement._sampled_from, agreement._seed = sampled_from, seed if sampled_from else None
+    return agreement
+
+
+def _compute_sampled(manifest, sampling, evaluate, profile=None, progress=None):
+    """
+    Evaluates batches of a stratified random sample of the documents (see `bratiaa.sampling`) until the confidence
+    intervals of the total F1 of all agreements are at most sampling.width wide or all documents are evaluated. Evaluate
+    maps a list of documents and a progress callback to a dict of name -> F1Agreement. Returns the merged agreements of
+    all batches with their estimates.
+
+    The first batch has sampling.batch_size documents, each further batch doubles the sample. The cost of the estimates
+    thus stays linear in the final sample size, and the overhead per batch (e.g. starting worker processes with
+    n_jobs > 1) is only paid a logarithmic number of times.
+    """
+    rng = np.random.default_rng(sampling.seed)
+    sample = StratifiedSample(manifest, sampling.stratum_func, rng)
+    batches = []
+    done = Progress(0, len(manifest), 0, 0)  # progress across batches, against all documents
+    while True:
+        batch_progress = None
+        if progress:
+            def batch_progress(p, offset=done):
+                nonlocal done
+                done = Progress(offset.documents_done + p.documents_done, len(manifest),
+                                offset.files_parsed + p.files_parsed, offset.bytes_read + p.bytes_read)
+                progress(done)
+        part = sample.draw(max(sampling.batch_size, sample.num_sampled))
+        batches.append(evaluate(part, batch_progress))
+        estimates = {}
+        with stage(profile, 'estimate'):
+            for name in batches[0]:
+                agreements = [batch[name] for batch in batches]
+                strata, weights, complete = sample.design([doc_id for a in agreements for doc_id in a._documents])
+                pdcl = np.concatenate([agreement._pdcl for agreement in agreements], axis=1)
+                estimates[name] = bootstrap_estimate(pdcl, strata, weights, complete, sampling, rng,
+                                                     sample.num_documents)
+        # undefined (NaN) widths do not stop sampling
+        if sample.exhausted or all(e.total_ci[1] - e.total_ci[0] <= sampling.width for e in estimates.values()):
+            break
+    if progress and not sample.exhausted:  # stopped early: the sample is complete
+        progress(done._replace(documents_total=done.documents_done))
+    merged = {}
+    for name, estimate in estimates.items():
+        first = batches[0][name]
+        agreement = merge(*(batch[name] for batch in batches))
+        agreement._estimate = estimate
+        agreement._cache, agreement._token_cache, agreement._profile = first._cache, first._token_cache, profile
+        merged[name] = agreement
+    return merged
+
+
+# eval function (None: exact match, instance- or token-based depending on token function), token function and engine
+Mode = namedtuple('Mode', ['eval_func', 'token_func', 'engine'])
+Mode.__new__.__defaults__ = (None, None, 'pairwise')
+
+MODES = {
+    'instance': Mode(),
+    'token': Mode(token_func=tokenize),
+}
+
+
+def compute_f1_agreements(project_root, modes=('instance', 'token'), input_gen=input_generator, n_jobs=1,
+                          storage='auto', cache_dir=None, token_cache=None, profile=None, progress=None,
+                          reference=None, pairs=None, sample_pairs=None, seed=None, sampling=None, scan_threads=None):
+    """
+    Computes the agreement of several modes (names from MODES or a dict of name -> Mode) in a single pass over the
+    project: configuration and directory tree are read once, each ANN file is parsed once for all modes based on
+    text-bound annotations (see `bratiaa.evaluation.TEXTBOUND_PARSERS`) and each text is tokenized once per token
+    function. Returns a dict of name -> F1Agreement, all sharing the given profile. Sampling and scan threads work as in
+    `compute_f1_agreement`, sampling until the confidence intervals of all modes are narrow enough.
+    """
+    if not isinstance(modes, dict):
+        modes = {name: MODES[name] for name in modes}
+    assert modes, 'At least one mode is necessary to compute agreement!'
+    _check_sampling(sampling, storage)
+    labels = _read_labels(project_root, profile)
+    manifest = _scan(_project_input_gen(input_gen, project_root, scan_threads), profile)
+    annotators, documents = _collect_annotators_and_documents(manifest)
+    assert len(annotators) > 1, 'At least two annotators are necessary to compute agreement!'
+    cache = CountCache(cache_dir) if cache_dir else None
+    # all modes share the (sampled) pairs
+    pairs, sampled_from = select_pairs(sorted(annotators), pairs, reference, sample_pairs, seed)
+
+    def evaluate(part, progress=progress):
+        agreements = {}
+        for name, mode in modes.items():
+            agreement = F1Agreement._from_layout(sorted(annotators), sorted(document.doc_id for document in part),
+                                                 labels, mode.token_func is not None, pairs=pairs, storage=storage,
+                                                 reference=reference)
+            agreement._sampled_from, agreement._seed = sampled_from, seed if sampled_from else None
+            agreement._configure(_default_eval_func(mode.eval_func, mode.token_func), mode.token_func,
+                                 n_jobs=n_jobs, cache=cache, engine=mode.engine, token_cache=token_cache,
+                                 profile=profile, progress=progress)
+            agreements[name] = agreement
+        _compute_tp_totals(list(agreements.values()), part)
+        return agreements
+
+    if sampling is None:
+        return evaluate(manifest)
+    return _compute_sampled(manifest, sampling, evaluate, profile, progress)
+
+
+def _check_sampling(sampling, storage):
+    if sampling is not None and storage == 'streaming':
+        raise ValueError('Sampling needs per-document counts, which streaming storage does not keep! Use "dense" or '
+                         '"sparse" storage.')
+
+
+def merge(*agreements, storage='auto'):
+    """
+    Merges agreements computed on disjoint sets of documents (e.g. shards of a large project) into one agreement with
+    the union of documents, annotators and labels. Statistics are identical to a single run over all documents.
+    """
+    assert agreements, 'At least one agreement is necessary for merging!'
+    if len({a._token_based for a in agreements}) > 1:
+        raise ValueError('Cannot merge instance-based and token-based agreement!')
+    if len({a._reference for a in agreements}) > 1:
+        raise ValueError('Cannot merge agreements with different reference annotators!')
+    documents = [d for a in agreements for d in a._documents]
+    if len(set(documents)) < len(documents):
+        raise ValueError('Cannot merge agreements sharing documents!')
+    annotators = sorted(set().union(*(a._annotators for a in agreements)))
+    labels = sorted(set().union(*(a._labels for a in agreements)))
+    pairs = None  # all pairs of the union of annotators, unless agreements are restricted to selected pairs
+    if any(len(a._pairs) < len(a._annotators) * (len(a._annotators) - 1) // 2 for a in agreements):
+        pairs = list({frozenset(pair): pair for a in agreements for pair in a._pairs}.values())
+    merged = F1Agreement._from_layout(annotators, sorted(documents), labels, agreements[0]._token_based, pairs=pairs,
+                                      storage=storage, reference=agreements[0]._reference)
+    sampled = [a for a in agreements if a._sampled_from]
+    if sampled:
+        merged._sampled_from = max(a._sampled_from for a in sampled)
+        merged._seed = sampled[0]._seed if len({a._seed for a in sampled}) == 1 else None
+    for agreement in agreements:
+        (pair_idx, doc_idx, count_idx, label_idx), values = agreement._counts.entries()
+        pair_map = np.array([merged._pair2idx[pair] for pair in agreement._pairs], dtype=np.intp)
+        doc_map = np.array([merged._doc2idx[d] for d in agreement._documents], dtype=np.intp)
+        label_map = np.array([merged._label2idx[l] for l in agreement._labels], dtype=np.intp)
+        merged._counts.add_entries((pair_map[pair_idx], doc_map[doc_idx], count_idx, label_map[label_idx]), values)
+    return merged
 
 
 def iaa_report(f1_agreement, precision=3):
+    with stage(f1_agreement.profile, 'report'):
+        _iaa_report(f1_agreement, precision)
+
+
+def _iaa_report(f1_agreement, precision):
     agreement_type = '* Instance-based F1 agreement'
-    if f1_agreement._token_func:
+    if f1_agreement._token_based:
         agreement_type = '* Token-based F1 agreement'
 
     print(f'# Inter-Annotator Agreement Report\n')
@@ -285,10 +960,27 @@ def iaa_report(f1_agreement, precision=3):
     print(f'* {len(f1_agreement.annotators)} annotators: {", ".join(f1_agreement.annotators)}')
     print(f'* {len(f1_agreement.documents)} agreement documents')
     print(f'* {len(f1_agreement.labels)} labels')
+    if f1_agreement.reference is not None:
+        print(f'* Reference annotator: {f1_agreement.reference} (annotators are only compared with the reference)')
+    if f1_agreement.sampled_from:
+        seed = f' (seed {f1_agreement._seed})' if f1_agreement._seed is not None else ''
+        print(f'* Sampled statistics: {len(f1_agreement.pairs)} of {f1_agreement.sampled_from} annotator pairs drawn '
+              f'at random{seed}')
+    elif f1_agreement.reference is None and \
+            len(f1_agreement.pairs) < len(f1_agreement.annotators) * (len(f1_agreement.annotators) - 1) // 2:
+        print(f'* {len(f1_agreement.pairs)} selected annotator pairs')
+
+    if f1_agreement.estimate is not None:
+        _print_estimate(f1_agreement.estimate, f1_agreement.labels, precision)
 
     print('\n## Agreement per Document\n')
-    f1_agreement.print_table('Document', f1_agreement.documents, *f1_agreement.mean_sd_per_document(),
-                             precision=precision)
+    if f1_agreement.streaming:
+        avg, stddev = f1_agreement.mean_sd_documents()
+        print('* No per-document table with streaming storage')
+        print(f'* Mean F1 over documents: {avg:.{precision}f}, SD F1: {stddev:.{precision}f}')
+    else:
+        f1_agreement.print_table('Document', f1_agreement.documents, *f1_agreement.mean_sd_per_document(),
+                                 precision=precision)
 
     print('\n## Agreement per Label\n')
     f1_agreement.print_table('Label', f1_agreement.labels, *f1_agreement.mean_sd_per_label(), precision=precision)
@@ -296,3 +988,17 @@ def iaa_report(f1_agreement, precision=3):
     print('\n## Overall Agreement\n')
     avg, stddev = f1_agreement.mean_sd_total()
     print(f'* Mean F1: {avg:.{precision}f}, SD F1: {stddev:.{precision}f}\n')
+
+
+def _print_estimate(estimate, labels, precision):
+    from tabulate import tabulate
+
+    print('\n## Sampled Estimate\n')
+    print(f'* {estimate.documents_sampled} of {estimate.documents_total} documents sampled from {estimate.strata} '
+          f'strata, the following sections only cover the sample')
+    print(f'* {estimate.confidence:.0%} confidence intervals from {estimate.bootstraps} bootstrap resamples')
+    lower, upper = estimate.total_ci
+    print(f'* Estimated mean F1: {estimate.total:.{precision}f} (CI: {lower:.{precision}f} - {upper:.{precision}f})\n')
+    rows = zip(labels, estimate.per_label, *estimate.per_label_ci)
+    headers = ['Label', 'Mean F1', 'CI lower', 'CI upper']
+    print(tabulate(rows, headers=headers, tablefmt='github', floatfmt=f'.{precision}f'))
@@ -1,15 +1,20 @@
 import logging
 
 import argparse
+import os
+import sys
 
-from bratiaa.agree import iaa_report, compute_f1_agreement
-from bratiaa.utils import tokenize
+from bratiaa.agree import iaa_report, compute_f1_agreements, F1Agreement, merge, MODES, select_pairs
+from bratiaa.cache import TokenCache, prune
+from bratiaa.engines import ENGINES
+from bratiaa.evaluation import as_evaluation, exact_match_instance_evaluation, exact_match_token_evaluation
+from bratiaa.profiling import Profile
+from bratiaa.progress import ProgressLine
+from bratiaa.sampling import Sampling
+from bratiaa.scan import list_subdirectories
 
 
-def parse_args():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('project_root',
-                        help='Root directory of the Brat annotation project')
+def add_output_args(parser):
     parser.add_argument('--heatmap',
                         help='Output path for F1-agreement heatmap',
                         dest='heatmap_path')
@@ -20,28 +25,240 @@ def parse_args():
     parser.add_argument('-s', '--silent',
                         help='Set log level on ERROR',
                         action='store_true')
+    parser.add_argument('--save',
+                        help='Output path for the agreement counts (NPZ file that can be merged with other shards)',
+                        dest='save_path')
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(epilog='Merge saved shards with: brat-iaa merge SHARD [SHARD ...]')
+    parser.add_argument('project_root',
+                        help='Root directory of the Brat annotation project')
+    add_output_args(parser)
     parser.add_argument('-t', '--tokenize',
-                        help='Token-based evaluation (tokenizer splits on whitespace)',
+                        help='Token-based evaluation (tokenizer splits on whitespace), short for --modes token',
+                        action='store_true')
+    parser.add_argument('--modes',
+                        help='Comma-separated agreement modes computed in a single pass over the project, one report '
+                             f'per mode ({", ".join(MODES)})',
+                        type=parse_modes)
+    parser.add_argument('--reference',
+                        help='Reference annotator (e.g. gold): only compare each other annotator with the reference '
+                             'instead of all pairs of annotators',
+                        metavar='ANNOTATOR')
+    parser.add_argument('--pairs',
+                        help='Comma-separated annotator pairs to compare instead of all pairs, e.g. "ann-1:ann-2,'
+                             'ann-1:ann-3"',
+                        type=parse_pairs)
+    parser.add_argument('--sample-pairs',
+                        help='Compare a random sample of K annotator pairs (the report marks statistics as sampled)',
+                        dest='sample_pairs',
+                        metavar='K',
+                        type=positive_int)
+    parser.add_argument('--seed',
+                        help='Seed of the random pair and document samples',
+                        type=int)
+    parser.add_argument('--ci-width',
+                        help='Estimate agreement from a stratified random sample of documents (by directory), sampled '
+                             'until the bootstrap confidence interval of the mean F1 is at most WIDTH wide',
+                        dest='ci_width',
+                        metavar='WIDTH',
+                        type=float)
+    parser.add_argument('--confidence',
+                        help='Confidence level of the intervals of --ci-width',
+                        type=float,
+                        default=0.95)
+    parser.add_argument('-j', '--jobs',
+                        help='Number of worker processes evaluating documents in parallel (< 1: one per CPU)',
+                        dest='jobs',
+                        type=int,
+                        default=1)
+    parser.add_argument('--scan-threads',
+                        help='Number of threads scanning the annotator directories (e.g. on network file systems)',
+                        dest='scan_threads',
+                        metavar='N',
+                        type=positive_int)
+    parser.add_argument('--engine',
+                        help='Engine computing the counts of annotator pairs: compare each pair (default) or all pairs '
+                             'at once via annotator bitmasks (instance-based) or per-label token arrays (token-based)',
+                        choices=['pairwise', 'bitmask', 'bitset'],
+                        default='pairwise')
+    parser.add_argument('--storage',
+                        help='Storage of the counts: dense or sparse tensor (auto: depending on its size) or running '
+                             'sums only (streaming, no per-document table)',
+                        choices=['auto', 'dense', 'sparse', 'streaming'],
+                        default='auto')
+    parser.add_argument('--cache-dir',
+                        help='Directory for caching per-document counts (only changed documents are re-evaluated) and '
+                             'tokenizations between runs',
+                        dest='cache_dir')
+    parser.add_argument('--cache-max-age',
+                        help='After the run, remove cache entries not used for more than DAYS days',
+                        dest='cache_max_age',
+                        metavar='DAYS',
+                        type=float)
+    parser.add_argument('--cache-max-size',
+                        help='After the run, remove the least recently used cache entries beyond MB megabytes',
+                        dest='cache_max_size',
+                        metavar='MB',
+                        type=float)
+    parser.add_argument('--profile',
+                        help='Print wall time, calls, bytes read and documents per stage to stderr (and write them to '
+                             'the given JSON file)',
+                        metavar='JSON_PATH',
+                        nargs='?',
+                        const='')
+    parser.add_argument('--progress',
+                        help='Show documents/s, MB/s and ETA on stderr while evaluating',
                         action='store_true')
-    return parser.parse_args()
+    args = parser.parse_args(args)
+    if args.storage == 'streaming' and args.save_path:
+        parser.error('--save needs per-document counts, which --storage streaming does not keep')
+    if args.storage == 'streaming' and args.ci_width is not None:
+        parser.error('--ci-width needs per-document counts, which --storage streaming does not keep')
+    if (args.cache_max_age is not None or args.cache_max_size is not None) and not args.cache_dir:
+        parser.error('--cache-max-age and --cache-max-size need --cache-dir')
+    if not any(supports_engine(MODES[name], args.engine) for name in mode_names(args)):
+        parser.error(f'--engine {args.engine} does not support the {" or ".join(mode_names(args))} mode')
+    check_annotators(parser, args)
+    return args
 
 
-def main():
-    args = parse_args()
+def check_annotators(parser, args):
+    """
+    Reports a reference annotator or pairs with annotators missing from the project (annotators are its
+    subdirectories) as usage error.
+    """
+    if (args.reference is None and args.pairs is None) or not os.path.isdir(args.project_root):
+        return
+    try:
+        select_pairs(list_subdirectories(args.project_root), args.pairs, args.reference)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'invalid positive number: {value!r}')
+    return number
+
+
+def mode_names(args):
+    return args.modes or (['token'] if args.tokenize else ['instance'])
+
+
+def parse_pairs(value):
+    pairs = [tuple(pair.strip().split(':')) for pair in value.split(',') if pair.strip()]
+    if not pairs or any(len(pair) != 2 for pair in pairs):
+        raise argparse.ArgumentTypeError(f'invalid annotator pairs: {value!r} (expected e.g. ann-1:ann-2,ann-1:ann-3)')
+    return pairs
+
+
+def parse_modes(value):
+    modes = [mode.strip() for mode in value.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown or not modes:
+        raise argparse.ArgumentTypeError(f'invalid modes: {value!r} (choose from {", ".join(MODES)})')
+    return modes
+
+
+def parse_merge_args(args=None):
+    parser = argparse.ArgumentParser(prog='brat-iaa merge',
+                                     description='Report agreement over shards saved with brat-iaa --save')
+    parser.add_argument('shards',
+                        help='NPZ files of agreements computed on disjoint sets of documents',
+                        nargs='+')
+    add_output_args(parser)
+    return parser.parse_args(args)
+
+
+def configure_logging(args):
     log_level = logging.WARNING
     if args.silent:
         log_level = logging.ERROR
     logging.basicConfig(level=log_level,
                         format='%(asctime)s - %(levelname)s - %(message)s')
 
-    token_func = None
-    if args.tokenize:
-        token_func = tokenize
 
-    f1_agreement = compute_f1_agreement(args.project_root, token_func=token_func)
+def suffixed(path, suffix):
+    if not (path and suffix):
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}.{suffix}{ext}'
+
+
+def output(f1_agreement, args, suffix=None):
     iaa_report(f1_agreement, args.precision)
     if args.heatmap_path:
-        f1_agreement.draw_heatmap(args.heatmap_path)
+        f1_agreement.draw_heatmap(suffixed(args.heatmap_path, suffix))
+    if args.save_path:
+        f1_agreement.save(suffixed(args.save_path, suffix))
+
+
+def main():
+    if sys.argv[1:2] == ['merge']:
+        return merge_main(sys.argv[2:])
+    args = parse_args()
+    configure_logging(args)
+
+    names = mode_names(args)
+    modes = {name: engine_mode(MODES[name], args.engine, explicit=len(names) == 1) for name in names}
+
+    token_cache = None
+    if args.cache_dir and any(mode.token_func for mode in modes.values()):
+        token_cache = TokenCache(os.path.join(args.cache_dir, 'tokens'))
+
+    profile = Profile() if args.profile is not None else None
+    sampling = None
+    if args.ci_width is not None:
+        sampling = Sampling(width=args.ci_width, confidence=args.confidence, seed=args.seed)
+    f1_agreements = compute_f1_agreements(args.project_root, modes, n_jobs=args.jobs, storage=args.storage,
+                                          cache_dir=args.cache_dir, token_cache=token_cache, profile=profile,
+                                          reference=args.reference, pairs=args.pairs,
+                                          sample_pairs=args.sample_pairs, seed=args.seed, sampling=sampling,
+                                          progress=ProgressLine() if args.progress else None,
+                                          scan_threads=args.scan_threads)
+    first = next(iter(f1_agreements.values()))
+    for cache in (first.cache, first.token_cache):
+        if cache:
+            print(cache, file=sys.stderr)
+    if args.cache_max_age is not None or args.cache_max_size is not None:
+        max_age = args.cache_max_age * 24 * 3600 if args.cache_max_age is not None else None
+        max_size = args.cache_max_size * 2 ** 20 if args.cache_max_size is not None else None
+        removed, freed = prune(args.cache_dir, max_age=max_age, max_size=max_size)
+        print(f'Pruned {removed} cache entries ({freed / 2 ** 20:.2f} MB)', file=sys.stderr)
+    for i, (name, f1_agreement) in enumerate(f1_agreements.items()):
+        if i:
+            print()
+        output(f1_agreement, args, suffix=name if len(f1_agreements) > 1 else None)
+    if profile:
+        print(profile.table(), file=sys.stderr)
+        if args.profile:
+            profile.save(args.profile)
+
+
+def engine_mode(mode, engine, explicit=True):
+    """
+    Applies the engine to the mode. With several modes, it only applies to the modes it supports (e.g. bitmask to the
+    instance-based one), otherwise an unsupported engine is an error (see `bratiaa.engines.get_engine`).
+    """
+    if explicit or supports_engine(mode, engine):
+        return mode._replace(engine=engine)
+    return mode
+
+
+def supports_engine(mode, engine):
+    if engine == 'pairwise':
+        return True
+    eval_func = mode.eval_func or (exact_match_token_evaluation if mode.token_func else exact_match_instance_evaluation)
+    return as_evaluation(eval_func) in ENGINES[engine]
+
+
+def merge_main(args=None):
+    args = parse_merge_args(args)
+    configure_logging(args)
+    output(merge(*(F1Agreement.load(shard) for shard in args.shards)), args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,270 @@
+"""
+Persistent, content-addressed caches of per-document agreement counts for incremental re-runs and of tokenizations.
+
+Entries are keyed by the content hashes of a document's ANN files (and text file, if tokenized) together with the
+identity of eval and token function and the list of labels. Changed inputs, functions or labels therefore lead to
+new keys; stale entries are never read again. Reading an entry refreshes its modification time, such that `prune` can
+remove the entries that were not used for a while (or the least recently used ones above a size limit).
+
+Functions are identified by module, qualified name and a hash of their code, defaults and closure (lambdas and nested
+functions share names), so bump `CACHE_VERSION` (or clear the cache directory) when their behavior changes through
+anything else, e.g. global variables or called functions.
+"""
+import hashlib
+import os
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from bratiaa.utils import TokenOverlap
+
+CACHE_VERSION = 1
+
+# suffixes of cache entries (count entries: non-zero counts, token entries: offsets) and of files being written
+ENTRY_SUFFIXES = {'.npz', '.npy'}
+TMP_SUFFIX = '.tmp'
+
+
+def _hasher():
+    return hashlib.blake2b(digest_size=20)
+
+
+def _file_digest(path, hasher, block_size=2 ** 20):
+    with open(path, mode='rb') as fin:
+        for block in iter(lambda: fin.read(block_size), b''):
+            hasher.update(block)
+
+
+def _save_atomic(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # write to temporary file and rename, such that concurrent readers never see partial entries
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, mode='wb') as fout:
+            write(fout)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _touch(path):
+    """
+    Marks an entry as recently used (see `prune`), ignoring read-only caches.
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune(cache_dir, max_age=None, max_size=None, now=None):
+    """
+    Removes the entries (and abandoned temporary files) of a cache directory that were not used for more than max_age
+    seconds, then the least recently used entries until the remaining ones take at most max_size bytes. Returns the
+    number of removed files and their total size in bytes.
+    """
+    now = time.time() if now is None else now
+    entries = []
+    for path in Path(cache_dir).rglob('*'):
+        if path.suffix in ENTRY_SUFFIXES or path.name.endswith(TMP_SUFFIX):
+            try:
+                stat = path.stat()
+            except OSError:  # removed concurrently
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()  # least recently used first
+    remaining = sum(size for _, size, _ in entries)
+    removed, freed = 0, 0
+    for mtime, size, path in entries:
+        expired = max_age is not None and now - mtime > max_age
+        if not expired and (max_size is None or remaining <= max_size):
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        remaining -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def _code_digest(code, hasher):
+    hasher.update(code.co_code)
+    hasher.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):  # nested function or comprehension
+            _code_digest(const, hasher)
+        else:
+            hasher.update(repr(const).encode('utf-8'))
+
+
+def _value_identity(value):
+    return func_identity(value) if callable(value) else repr(value)
+
+
+def func_identity(func):
+    """
+    Stable name of a (partially applied) function, including a hash of the code, defaults and closure of Python
+    functions.
+    """
+    if func is None:
+        return ''
+    if isinstance(func, partial):
+        return f'{func_identity(func.func)}{func.args!r}{sorted(func.keywords.items())!r}'
+    if isinstance(func, tuple):  # e.g. Evaluation
+        return '(' + ','.join(func_identity(f) for f in func) + ')'
+    name = f'{getattr(func, "__module__", "")}.{getattr(func, "__qualname__", repr(func))}'
+    code = getattr(func, '__code__', None)
+    if code is None:  # builtin or callable object
+        return name
+    hasher = _hasher()
+    _code_digest(code, hasher)
+    for value in (func.__defaults__ or ()) + tuple(sorted((func.__kwdefaults__ or {}).items())):
+        hasher.update(_value_identity(value).encode('utf-8'))
+    for cell in func.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:  # empty cell
+            continue
+        if value is not func:  # recursive nested function
+            hasher.update(_value_identity(value).encode('utf-8'))
+    return f'{name}#{hasher.hexdigest()}'
+
+
+class CountCache:
+    """
+    Directory of per-document count arrays with shape (document pairs, 2, labels), where document pairs follow the
+    order of `combinations(document.ann_files, 2)` (restricted to the evaluated positions, if any). Entries keep the
+    non-zero counts only (compressed NPZ files).
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def namespace(evaluation, token_func, labels):
+        hasher = _hasher()
+        hasher.update(repr((CACHE_VERSION, func_identity(evaluation), func_identity(token_func),
+                            list(labels))).encode('utf-8'))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def document_key(namespace, document, with_text=False, pairs=None):
+        hasher = _hasher()
+        hasher.update(namespace.encode('utf-8'))
+        if pairs is not None:
+            hasher.update(f'\0pairs:{",".join(map(str, pairs))}'.encode('utf-8'))
+        if with_text:
+            _file_digest(document.txt_path, hasher)
+        for ann_file in document.ann_files:
+            hasher.update(f'\0{ann_file.annotator_id}\0'.encode('utf-8'))
+            _file_digest(ann_file.ann_path, hasher)
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key[2:]}.npz'
+
+    def load(self, key):
+        """
+        Returns cached counts or None (miss).
+        """
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                counts = np.zeros(tuple(entry['shape']), dtype=np.int32)
+                counts.flat[entry['indices']] = entry['values']
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        _touch(path)
+        self.hits += 1
+        return counts
+
+    def store(self, key, counts):
+        """
+        Stores the non-zero counts only, most of the (document pairs, 2, labels) array is usually zero.
+        """
+        counts = np.asarray(counts, dtype=np.int32)
+        indices = np.flatnonzero(counts)
+        _save_atomic(self._path(key), lambda fout: np.savez_compressed(
+            fout, shape=np.array(counts.shape), indices=indices, values=counts.flat[indices]))
+
+    def stats(self):
+        return self.hits, self.misses
+
+    def __str__(self):
+        return f'{self.hits} cache hits, {self.misses} cache misses ({self.cache_dir})'
+
+
+class TokenCache:
+    """
+    Token offsets by text content and tokenizer identity, kept in an in-memory LRU and optionally in a directory of
+    int32 arrays (starts and ends) that are loaded via memory mapping. Can be shared by several agreements, e.g. to
+    compute instance- and token-based agreement or to compare tokenizers on the same texts.
+    """
+
+    def __init__(self, cache_dir=None, maxsize=1024):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+
+    def __getstate__(self):
+        # worker processes receive an empty in-memory cache
+        state = self.__dict__.copy()
+        state['_lru'] = OrderedDict()
+        return state
+
+    def token_overlap(self, text, token_func):
+        """
+        Returns the `TokenOverlap` of given text tokenized by token_func, tokenizing only on a miss.
+        """
+        hasher = _hasher()
+        hasher.update(f'{CACHE_VERSION}\0{func_identity(token_func)}\0'.encode('utf-8'))
+        hasher.update(text.encode('utf-8', errors='surrogatepass'))
+        key = hasher.hexdigest()
+        offsets = self._lru.get(key)
+        if offsets is not None:
+            self._lru.move_to_end(key)
+        elif self.cache_dir:
+            offsets = self._load(key)
+        if offsets is None:
+            self.misses += 1
+            offsets = np.array(list(token_func(text)), dtype=np.int32).reshape(-1, 2).T.copy()
+            if self.cache_dir:
+                _save_atomic(self._path(key), lambda fout: np.save(fout, offsets, allow_pickle=False))
+        else:
+            self.hits += 1
+        self._lru[key] = offsets
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+        return TokenOverlap.from_offsets(len(text), offsets[0], offsets[1])
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key[2:]}.npy'
+
+    def _load(self, key):
+        path = self._path(key)
+        try:
+            offsets = np.load(path, mmap_mode='r', allow_pickle=False)
+        except (OSError, ValueError, EOFError):
+            return None
+        _touch(path)
+        return offsets
+
+    def stats(self):
+        return self.hits, self.misses
+
+    def __str__(self):
+        location = f' ({self.cache_dir})' if self.cache_dir else ''
+        return f'{self.hits} token cache hits, {self.misses} token cache misses{location}'
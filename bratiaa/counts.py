@@ -0,0 +1,265 @@
+"""
+Storage backends for the (pair, document, count, label) tensor of F1Agreement, where count is either the number of
+true positives or the total (2*tp+fp+fn).
+
+The dense and sparse backends answer the aggregations needed for reporting without materializing the full dense tensor.
+The streaming backend only keeps running sums over documents and running moments of per-document F1 scores, its memory
+does not depend on the number of documents. Aggregations are memoized until counts are added.
+"""
+import numpy as np
+
+# estimated size of the dense tensor (in bytes) above which 'auto' storage chooses the sparse backend
+DENSE_LIMIT = 2 ** 28
+
+
+class _MemoizedSums:
+    """
+    Memoizes the (read-only) marginals computed by `_sum_documents` and `_sum_labels` of subclasses. Subclasses call
+    `_invalidate` whenever counts change.
+    """
+
+    def _invalidate(self):
+        self._sums = {}
+
+    def _memoized(self, name, compute):
+        if name not in self._sums:
+            value = compute()
+            value.setflags(write=False)
+            self._sums[name] = value
+        return self._sums[name]
+
+    def sum_documents(self):
+        """
+        (pair, count, label) counts summed over documents.
+        """
+        return self._memoized('pcl', self._sum_documents)
+
+    def sum_labels(self):
+        """
+        (pair, document, count) counts summed over labels.
+        """
+        return self._memoized('pdc', self._sum_labels)
+
+    def sum_documents_labels(self):
+        """
+        (pair, count) counts summed over documents and labels.
+        """
+        return self._memoized('pc', lambda: np.sum(self.sum_documents(), axis=2))
+
+    def document_f1_moments(self):
+        """
+        (pair, moment) array with the number of documents, mean and sum of squared deviations from the mean (M2) of the
+        per-document F1 scores (summed over labels) of each pair. Documents with undefined F1 (no annotations of the
+        pair) are skipped.
+        """
+        return self._memoized('moments', self._document_f1_moments)
+
+    def _document_f1_moments(self):
+        pdc = self.sum_labels()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f1 = 2 * pdc[:, :, 0] / pdc[:, :, 1]
+            defined = ~np.isnan(f1)
+            count = defined.sum(axis=1)
+            mean = np.where(defined, f1, 0).sum(axis=1) / count
+        m2 = np.where(defined, (f1 - mean[:, None]) ** 2, 0).sum(axis=1)
+        return np.stack((count, mean, m2), axis=1)
+
+
+class DenseCounts(_MemoizedSums):
+    """
+    Dense int32 array of shape (pairs, documents, 2, labels).
+    """
+
+    def __init__(self, num_pairs, num_documents, num_labels):
+        self._pdcl = np.zeros((num_pairs, num_documents, 2, num_labels), dtype=np.int32)
+        self._invalidate()
+
+    @property
+    def shape(self):
+        return self._pdcl.shape
+
+    def add(self, doc_idx, pcl):
+        """
+        Adds the (pair, count, label) counts of one document.
+        """
+        self._pdcl[:, doc_idx] += pcl
+        self._invalidate()
+
+    def entries(self):
+        """
+        Non-zero counts as ((pair, document, count, label) index arrays, values).
+        """
+        indices = np.nonzero(self._pdcl)
+        return indices, self._pdcl[indices]
+
+    def add_entries(self, indices, values):
+        np.add.at(self._pdcl, tuple(indices), values)
+        self._invalidate()
+
+    def _sum_documents(self):
+        return np.sum(self._pdcl, axis=1)
+
+    def _sum_labels(self):
+        return np.sum(self._pdcl, axis=3)
+
+    def to_dense(self):
+        """
+        Read-only view of the tensor (counts must only change via `add` and `add_entries`, which invalidate the sums).
+        """
+        pdcl = self._pdcl.view()
+        pdcl.setflags(write=False)
+        return pdcl
+
+
+class SparseCounts(_MemoizedSums):
+    """
+    Sparse documents x (pair, count, label) matrix, collected as COO triplets and queried in CSR format.
+    """
+
+    def __init__(self, num_pairs, num_documents, num_labels):
+        self._shape = (num_pairs, num_documents, 2, num_labels)
+        self._rows, self._cols, self._data = [], [], []
+        self._matrix = None
+        self._invalidate()
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def add(self, doc_idx, pcl):
+        """
+        Adds the (pair, count, label) counts of one document.
+        """
+        flat = np.ravel(pcl)
+        cols = np.flatnonzero(flat)
+        self._rows.append(np.full(len(cols), doc_idx, dtype=np.int32))
+        self._cols.append(cols.astype(np.int32))
+        self._data.append(flat[cols].astype(np.int32))
+        self._matrix = None
+        self._invalidate()
+
+    def entries(self):
+        """
+        Non-zero counts as ((pair, document, count, label) index arrays, values).
+        """
+        num_pairs, _, _, num_labels = self._shape
+        coo = self._csr().tocoo()
+        nonzero = coo.data != 0
+        pairs, counts, labels = np.unravel_index(coo.col[nonzero], (num_pairs, 2, num_labels))
+        return (pairs, coo.row[nonzero], counts, labels), coo.data[nonzero]
+
+    def add_entries(self, indices, values):
+        num_pairs, _, _, num_labels = self._shape
+        pairs, documents, counts, labels = indices
+        self._rows.append(np.asarray(documents, dtype=np.int32))
+        self._cols.append(np.ravel_multi_index((pairs, counts, labels), (num_pairs, 2, num_labels)).astype(np.int32))
+        self._data.append(np.asarray(values, dtype=np.int32))
+        self._matrix = None
+        self._invalidate()
+
+    def _csr(self):
+        if self._matrix is None:
+            from scipy import sparse  # slow import, only needed for large projects
+
+            num_pairs, num_documents, _, num_labels = self._shape
+            rows, cols, data = (np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+                                for chunks in (self._rows, self._cols, self._data))
+            # duplicate entries are summed up
+            self._matrix = sparse.csr_matrix((data, (rows, cols)), shape=(num_documents, num_pairs * 2 * num_labels))
+            coo = self._matrix.tocoo()
+            self._rows, self._cols, self._data = [coo.row], [coo.col], [coo.data]
+        return self._matrix
+
+    def _sum_documents(self):
+        num_pairs, _, _, num_labels = self._shape
+        return np.asarray(self._csr().sum(axis=0)).reshape(num_pairs, 2, num_labels)
+
+    def _sum_labels(self):
+        from scipy import sparse
+
+        num_pairs, num_documents, _, num_labels = self._shape
+        # (pair, count, label) columns -> (pair, count) columns
+        cols = np.arange(num_pairs * 2 * num_labels)
+        label_sum = sparse.csr_matrix((np.ones(len(cols), dtype=np.int64), (cols, cols // num_labels)),
+                                      shape=(len(cols), num_pairs * 2))
+        dpc = (self._csr() @ label_sum).toarray().reshape(num_documents, num_pairs, 2)
+        return dpc.transpose(1, 0, 2)
+
+    def to_dense(self):
+        num_pairs, num_documents, _, num_labels = self._shape
+        dpcl = self._csr().toarray().reshape(num_documents, num_pairs, 2, num_labels)
+        return dpcl.transpose(1, 0, 2, 3)
+
+
+class StreamingCounts(_MemoizedSums):
+    """
+    Running (pair, count, label) sums and Welford moments of the per-document F1 scores of each pair, O(pairs x labels)
+    memory regardless of the number of documents. Each call of `add` is taken as the complete counts of one document.
+    Per-document counts are not kept, hence neither `sum_labels`, `entries` nor `to_dense` are available.
+    """
+
+    def __init__(self, num_pairs, num_documents, num_labels):
+        self._shape = (num_pairs, num_documents, 2, num_labels)
+        self._pcl = np.zeros((num_pairs, 2, num_labels), dtype=np.int64)
+        self._moments = np.zeros((num_pairs, 3))  # documents, mean, M2
+        self._invalidate()
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def add(self, doc_idx, pcl):
+        """
+        Adds the (pair, count, label) counts of one document.
+        """
+        self._pcl += pcl
+        pc = np.sum(pcl, axis=2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f1 = 2 * pc[:, 0] / pc[:, 1]
+        defined = np.flatnonzero(~np.isnan(f1))
+        count, mean, m2 = self._moments[defined].T
+        count += 1
+        delta = f1[defined] - mean
+        mean += delta / count
+        m2 += delta * (f1[defined] - mean)
+        self._moments[defined] = np.stack((count, mean, m2), axis=1)
+        self._invalidate()
+
+    def entries(self):
+        self._per_document('entries')
+
+    def add_entries(self, indices, values):
+        self._per_document('add_entries')
+
+    def _sum_documents(self):
+        return self._pcl.copy()
+
+    def _sum_labels(self):
+        self._per_document('sum_labels')
+
+    def _document_f1_moments(self):
+        return self._moments.copy()
+
+    def to_dense(self):
+        self._per_document('to_dense')
+
+    @staticmethod
+    def _per_document(name):
+        raise ValueError(f'Streaming counts keep no per-document counts ({name})! Use "dense" or "sparse" storage.')
+
+
+def create_counts(num_pairs, num_documents, num_labels, storage='auto'):
+    """
+    Returns an empty count store. Storage is either 'dense', 'sparse', 'streaming' or 'auto' (dense unless the dense
+    int32 tensor would exceed DENSE_LIMIT bytes).
+    """
+    if storage == 'auto':
+        dense_size = num_pairs * num_documents * 2 * num_labels * np.dtype(np.int32).itemsize
+        storage = 'sparse' if dense_size > DENSE_LIMIT else 'dense'
+    if storage == 'dense':
+        return DenseCounts(num_pairs, num_documents, num_labels)
+    if storage == 'sparse':
+        return SparseCounts(num_pairs, num_documents, num_labels)
+    if storage == 'streaming':
+        return StreamingCounts(num_pairs, num_documents, num_labels)
+    raise ValueError(f'Unknown storage "{storage}"! Expected "auto", "dense", "sparse" or "streaming".')
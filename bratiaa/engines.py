@@ -0,0 +1,143 @@
+"""
+Engines computing the counts of all annotator pairs of a document at once, as alternatives to comparing the parsed
+annotations of each pair with the eval function.
+
+An engine parses each ANN file of a document once; its counts function takes the parsed annotations of all annotators
+(in the order of `document.ann_files`) and a label index and returns an int64 array of shape (pairs, 2, labels) with
+true positives and totals (2*tp+fp+fn), where pairs follow the order of `combinations(range(num_annotators), 2)`.
+"""
+import logging
+from collections import namedtuple
+from itertools import combinations
+from operator import attrgetter
+
+import numpy as np
+
+from bratiaa.evaluation import INSTANCE_EVALUATION, TOKEN_EVALUATION, TEXTBOUND_PARSERS, read_instance_annotations, \
+    textbounds_of
+
+_get_label = attrgetter('label')
+
+# parse(ann_path, tokens=None) -> parsed annotations, counts(parsed annotations of all annotators, label2idx) -> counts
+Engine = namedtuple('Engine', ['parse', 'counts'])
+
+
+def label_indices(labels, label2idx):
+    """
+    Maps labels to label indices in bulk, logging and re-raising the KeyError of an unknown label.
+    """
+    try:
+        return np.fromiter(map(label2idx.__getitem__, labels), dtype=np.intp)
+    except KeyError as e:
+        logging.error(
+            f'Encountered unknown label "{e.args[0]}"! Please make sure that your "annotation.conf" '
+            f'(https://brat.nlplab.org/configuration.html#annotation-configuration) '
+            f'is located under the project root and contains an exhaustive list of entities!'
+        )
+        raise
+
+
+def instance_bitmask_counts(parsed, label2idx):
+    """
+    Exact-match instance counts of all annotator pairs. Every distinct annotation is mapped to a bitmask of the
+    annotators who produced it; true positives of all pairs are then computed per distinct (label, bitmask) pattern
+    instead of intersecting the sets of every pair, i.e. in O(A*n + P*A^2) for P patterns rather than O(A^2*n).
+    """
+    num_annotators = len(parsed)
+    masks = {}
+    for i, annotations in enumerate(parsed):
+        bit = 1 << i
+        for annotation in annotations:
+            masks[annotation] = masks.get(annotation, 0) | bit
+    patterns = {}
+    for annotation, mask in masks.items():
+        key = (annotation.label, mask)
+        patterns[key] = patterns.get(key, 0) + 1
+    num_labels = len(label2idx)
+    labels = label_indices((label for label, _ in patterns), label2idx)
+    # (pattern, annotator) membership matrix from the little-endian bytes of the bitmasks
+    num_bytes = (num_annotators + 7) // 8
+    mask_bytes = b''.join(mask.to_bytes(num_bytes, 'little') for _, mask in patterns)
+    members = np.unpackbits(np.frombuffer(mask_bytes, dtype=np.uint8).reshape(len(patterns), num_bytes), axis=1,
+                            bitorder='little')[:, :num_annotators].astype(np.int64)
+    weights = np.fromiter(patterns.values(), dtype=np.int64, count=len(patterns))
+    # tp[l, i, j] := number of distinct annotations with label l produced by annotators i and j
+    tp = np.zeros((num_labels, num_annotators, num_annotators), dtype=np.int64)
+    for label in np.unique(labels):
+        selected = labels == label
+        tp[label] = members[selected].T @ (weights[selected, None] * members[selected])
+    first, second = np.triu_indices(num_annotators, 1)  # same order as combinations
+    counts = np.empty((len(first), 2, num_labels), dtype=np.int64)
+    counts[:, 0] = tp[:, first, second].T
+    counts[:, 1] = (tp[:, first, first] + tp[:, second, second]).T  # diagonal: annotations per annotator
+    return counts
+
+
+def read_token_counts(ann_path, tokens=None):
+    """
+    Per label, the number of (distinct) annotation spans covering each token, as int32 array over token indices.
+    Represents the same multiset as `bratiaa.evaluation.read_token_annotations` without creating one annotation per
+    token.
+    """
+    labels, offsets = [], []
+    for label, spans in set(textbounds_of(ann_path)):
+        for span in spans:
+            labels.append(label)
+            offsets.append(span)
+    offsets = np.array(offsets, dtype=np.int64).reshape(-1, 2)
+    # resolve all spans of the file in one call
+    first, last = tokens.token_ranges(offsets[:, 0], offsets[:, 1])
+    labels = np.array(labels)
+    num_tokens = len(tokens.starts)
+    token_counts = {}
+    for label in np.unique(labels).tolist():
+        selected = labels == label
+        # +1 at the first and -1 after the last token of each range, cumulative sum yields the coverage
+        diff = np.zeros(num_tokens + 1, dtype=np.int32)
+        np.add.at(diff, first[selected], 1)
+        np.add.at(diff, last[selected], -1)
+        token_counts[label] = np.cumsum(diff[:-1], dtype=np.int32)
+    return token_counts
+
+
+def token_bitset_counts(parsed, label2idx):
+    """
+    Exact-match token counts of all annotator pairs from per-label token arrays: true positives are the sum of the
+    element-wise minimum (multiset intersection), totals the sums of both arrays.
+    """
+    num_labels = len(label2idx)
+    indices = [dict(zip(token_counts, label_indices(token_counts, label2idx))) for token_counts in parsed]
+    totals = np.zeros((len(parsed), num_labels), dtype=np.int64)
+    for i, token_counts in enumerate(parsed):
+        for label, label_counts in token_counts.items():
+            totals[i, indices[i][label]] = label_counts.sum()
+    num_annotators = len(parsed)
+    counts = np.zeros((num_annotators * (num_annotators - 1) // 2, 2, num_labels), dtype=np.int64)
+    for cl, (i, j) in zip(counts, combinations(range(num_annotators), 2)):
+        for label in parsed[i].keys() & parsed[j].keys():
+            cl[0, indices[i][label]] = np.minimum(parsed[i][label], parsed[j][label]).sum()
+        cl[1] = totals[i] + totals[j]
+    return counts
+
+
+TEXTBOUND_PARSERS.add(read_token_counts)
+
+# engine name -> {evaluation: engine}
+ENGINES = {
+    'bitmask': {INSTANCE_EVALUATION: Engine(read_instance_annotations, instance_bitmask_counts)},
+    'bitset': {TOKEN_EVALUATION: Engine(read_token_counts, token_bitset_counts)},
+}
+
+
+def get_engine(name, evaluation):
+    """
+    Engine for given name and evaluation, None for the default 'pairwise' comparison.
+    """
+    if name == 'pairwise':
+        return None
+    if name not in ENGINES:
+        raise ValueError(f'Unknown engine "{name}"! Expected one of: pairwise, {", ".join(ENGINES)}.')
+    try:
+        return ENGINES[name][evaluation]
+    except KeyError:
+        raise ValueError(f'Engine "{name}" does not support the given eval function!') from None
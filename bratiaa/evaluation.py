@@ -1,24 +1,96 @@
 """
 Functions for computing the difference between two sets of annotations.
+
+An eval function either takes two ANN paths and returns true positives, expected and predicted annotations, or is an
+`Evaluation` that splits this into parsing each file (once per document) and comparing the parsed annotations of a
+pair of annotators. Parse functions in `TEXTBOUND_PARSERS` also accept text-bound annotations read with
+`read_textbounds` instead of a path, such that several evaluations can share one read of each file.
 """
+import os
+import re
 from collections import namedtuple, Counter
 
-import bratsubset.annotation as bs
-
 Annotation = namedtuple('Annotation', ['type', 'label', 'offsets'])
 
+# parse(ann_path, tokens=None) -> parsed annotations, compare(parsed_1, parsed_2, tokens=None) -> (tp, exp, pred)
+Evaluation = namedtuple('Evaluation', ['parse', 'compare'])
+
 
 def exact_match_instance_evaluation(ann_path_1, ann_path_2, tokens=None):
-    exp = set(_read_textbound_annotations(ann_path_1))
-    pred = set(_read_textbound_annotations(ann_path_2))
+    return compare_instance_annotations(read_instance_annotations(ann_path_1), read_instance_annotations(ann_path_2))
+
+
+def read_instance_annotations(ann_path, tokens=None):
+    return set(_read_textbound_annotations(ann_path))
+
+
+def compare_instance_annotations(exp, pred, tokens=None):
     tp = exp.intersection(pred)
     return tp, exp, pred
 
 
 def _read_textbound_annotations(ann_path):
-    with bs.Annotations(ann_path.as_posix(), read_only=True) as annotations:
-        for annotation in annotations.get_textbounds():
-            yield Annotation('T', annotation.type, tuple(annotation.spans))
+    for label, spans in textbounds_of(ann_path):
+        yield Annotation('T', label, spans)
+
+
+def textbounds_of(ann):
+    """
+    (label, spans) tuples of an ANN file path or of text-bound annotations already read with `read_textbounds`.
+    """
+    if isinstance(ann, (str, os.PathLike)):
+        return read_textbounds(ann)
+    return ann
+
+
+# valid brat IDs of text-bound annotations (cf. `bratsubset.annotation.is_valid_id`)
+TEXTBOUND_ID = re.compile(r'T[A-Za-z]*[0-9]+')
+
+
+def read_textbounds(ann_path):
+    """
+    Streams the text-bound annotations of an ANN file as compact (label, spans) tuples, where spans is a tuple of
+    (start, end) offset tuples. All other lines are skipped without parsing.
+
+    Yields the same text-bound annotations as `bratsubset.annotation.Annotations`: malformed lines and lines with an
+    already used ID are ignored. Unlike brat, a missing file is an error and is never created.
+    """
+    with open(ann_path, encoding='utf-8', errors='strict') as fin:
+        yield from parse_textbounds(fin)
+
+
+def parse_textbounds(lines):
+    """
+    Text-bound annotations of the lines of an ANN file (see `read_textbounds`).
+    """
+    seen_ids = set()
+    for line in lines:
+        if not line.startswith('T'):
+            continue
+        id, tab, id_tail = line.partition('\t')
+        if not tab or id in seen_ids or not TEXTBOUND_ID.match(id):
+            continue
+        seen_ids.add(id)  # brat reserves the IDs of unparsable lines as well
+        try:
+            yield _split_textbound_data(id_tail.split('\t', 1)[0])
+        except ValueError:
+            continue
+
+
+def _split_textbound_data(data):
+    """
+    Splits "TYPE START END[;START END]*" into label and spans (cf. `Annotations._split_textbound_data`).
+    """
+    label, rest = data.split(' ', 1)
+    spans = []
+    for span_str in rest.split(';'):
+        start_str, end_str = span_str.split(' ', 2)
+        # ignore trailing whitespace
+        end_str = end_str.rstrip()
+        if any(c.isspace() for c in end_str):
+            raise ValueError(f'Error parsing textbound "{data}". (Using space instead of tab?)')
+        spans.append((int(start_str), int(end_str)))
+    return label, tuple(spans)
 
 
 def exact_match_token_evaluation(ann_path_1, ann_path_2, tokens=None):
@@ -28,10 +100,20 @@ def exact_match_token_evaluation(ann_path_1, ann_path_2, tokens=None):
     Sub-token annotations are expanded to full tokens. Long annotations will influence the results more than short
     annotations. Boundary errors for adjacent annotations with the same label are ignored!
     """
-    exp_list = list(_read_token_annotations(ann_path_1, tokens))
-    pred_list = list(_read_token_annotations(ann_path_2, tokens))
-    tp = counter2list(Counter(exp_list) & Counter(pred_list))
-    return tp, exp_list, pred_list
+    return compare_token_annotations(read_token_annotations(ann_path_1, tokens),
+                                     read_token_annotations(ann_path_2, tokens))
+
+
+def read_token_annotations(ann_path, tokens=None):
+    """
+    Multiset of token annotations (see `_read_token_annotations`).
+    """
+    return Counter(_read_token_annotations(ann_path, tokens))
+
+
+def compare_token_annotations(exp, pred, tokens=None):
+    tp = counter2list(exp & pred)
+    return tp, list(exp.elements()), list(pred.elements())
 
 
 def counter2list(c):
@@ -49,3 +131,28 @@ def _read_token_annotations(ann_path, tokens):
         for start, end in annotation.offsets:
             for ts, te in tokens.overlapping_tokens(start, end):
                 yield Annotation(annotation.type, annotation.label, ((ts, te),))
+
+
+# parse functions accepting the result of `read_textbounds` instead of a path
+TEXTBOUND_PARSERS = {read_instance_annotations, read_token_annotations}
+
+INSTANCE_EVALUATION = Evaluation(read_instance_annotations, compare_instance_annotations)
+TOKEN_EVALUATION = Evaluation(read_token_annotations, compare_token_annotations)
+
+
+def as_evaluation(eval_func):
+    """
+    Returns the `Evaluation` for given eval function. Path-based eval functions without a known parsed counterpart are
+    wrapped, such that they still receive the ANN paths.
+    """
+    if isinstance(eval_func, Evaluation):
+        return eval_func
+    if eval_func is exact_match_instance_evaluation:
+        return INSTANCE_EVALUATION
+    if eval_func is exact_match_token_evaluation:
+        return TOKEN_EVALUATION
+    return Evaluation(_keep_path, eval_func)
+
+
+def _keep_path(ann_path, tokens=None):
+    return ann_path
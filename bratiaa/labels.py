@@ -0,0 +1,177 @@
+"""
+Reads the entity types of a brat project from its annotation.conf without building the full project configuration.
+
+All sections are checked with the rules of brat's term hierarchy parser (macros, argument syntax, repetition ranges,
+parents of indented lines, ...), since an error in any section makes brat fall back to a minimal configuration.
+Configurations that are invalid or use features the fast path does not reproduce (deprecated spaces in terms, missing or
+unreadable annotation.conf, ...) are read with brat's ProjectConfiguration instead.
+"""
+import os
+import re
+
+ANNOTATION_CONFIG = 'annotation.conf'
+ENTITY_SECTION = 'entities'
+SECTION_ALIAS = {'spans': ENTITY_SECTION}
+GENERAL_SECTION = 'general'
+
+# as in bratsubset.projectconfig
+RESERVED_NAMES = {'ANY', 'ENTITY', 'RELATION', 'EVENT', 'NONE', 'EMPTY', 'REL-TYPE', 'URL', 'URLBASE', 'GLYPH-POS',
+                  'DEFAULT', 'NORM', 'OVERLAP', 'OVL-TYPE', 'INHERIT'}
+RESERVED_STRINGS = {f'<{name}>' for name in RESERVED_NAMES}
+SPECIAL_RELATION_TYPES = {'ENTITY-NESTING', '<OVERLAP>'}
+
+SECTION = re.compile(r'^\s*\[(.*)\]\s*$')
+COMMENT = re.compile(r'^\s*#')
+SEPARATOR = re.compile(r'^\s*-+\s*$')
+MACRO_DEFINITION = re.compile(r'^<([a-zA-Z_-]+)>=\s*(.*?)\s*$')
+MACRO_USE = re.compile(r'(<.*?>)')
+TERM_LINE = re.compile(r'^(\s*)(\S+)(?:\s+(.*))?$')
+TAB_TERM_LINE = re.compile(r'^(\s*)([^\t]+)(?:\t(.*))?$')  # [labels] section
+ARGUMENT = re.compile(r'^(\S*?):(\S*)$')
+REPETITION = re.compile(r'^(\S+?)(\{\S+\}|\?|\*|\+|)$')
+RANGE = re.compile(r'\{(\d+)(?:-(\d+))?\}$')
+NON_STORAGE_CHAR = re.compile(r'[^a-zA-Z0-9_-]')
+
+
+class _Unsupported(ValueError):
+    """
+    Configuration rejected by brat (minimal fallback configuration) or not handled by the fast path.
+    """
+
+
+class _Node:
+    def __init__(self, storage_form):
+        self.storage_form = storage_form
+        self.children = []
+
+    def collect(self, collected):
+        collected.append(self.storage_form)
+        for child in self.children:
+            child.collect(collected)
+        return collected
+
+
+def section_lines(config_str):
+    """
+    Lines of each section (by name, aliases resolved) in order of first occurrence, starting with the general section.
+    """
+    section = GENERAL_SECTION
+    sections = {section: []}
+    for line in config_str.split('\n'):
+        m = SECTION.match(line)
+        if m:
+            section = SECTION_ALIAS.get(m.group(1), m.group(1))
+            sections.setdefault(section, [])
+        else:
+            sections[section].append(line)
+    return sections
+
+
+def _check_arguments(args):
+    """
+    Raises _Unsupported for arguments `TypeHierarchyNode` rejects.
+    """
+    keys = set()
+    for arg in args:
+        m = ARGUMENT.match(arg.strip())
+        if not m:
+            raise _Unsupported(arg)  # no key:type
+        key, types = m.groups()
+        if key in RESERVED_STRINGS:
+            continue
+        m = REPETITION.match(key)
+        if not m:
+            raise _Unsupported(arg)
+        key, repetition = m.groups()
+        maximum_count = 1 if repetition in ('', '?') else 2  # only "more than one" matters
+        if repetition.startswith('{'):
+            m = RANGE.match(repetition)
+            if not m or (m.group(2) is None and int(m.group(1)) == 0) or \
+                    (m.group(2) is not None and int(m.group(1)) > int(m.group(2))):
+                raise _Unsupported(arg)  # invalid range
+            maximum_count = int(m.group(2) if m.group(2) is not None else m.group(1))
+        if maximum_count > 1 and key[-1].isdigit():
+            raise _Unsupported(arg)  # repeated argument ending with a digit
+        if key in keys or any(not t.strip() for t in types.split('|')):
+            raise _Unsupported(arg)  # duplicate argument or empty type
+        keys.add(key)
+
+
+def parse_section(lines, section):
+    """
+    Root nodes of the term hierarchy of a section, raises _Unsupported wherever brat's parser fails.
+    """
+    root_nodes = []
+    last_node_at_depth = {}
+    last_args_at_depth = {}
+    macros = {}
+    for line in lines:
+        if not line.strip() or COMMENT.match(line) or SEPARATOR.match(line):
+            continue
+        m = MACRO_DEFINITION.match(line)
+        if m:
+            if m.group(1) in RESERVED_NAMES:
+                raise _Unsupported(line)
+            macros[f'<{m.group(1)}>'] = m.group(2)
+            continue
+        for name, value in macros.items():
+            line = line.replace(name, value)
+        if any(use not in RESERVED_STRINGS for use in MACRO_USE.findall(line)):
+            raise _Unsupported(line)  # undefined macro
+        m = (TAB_TERM_LINE if section == 'labels' else TERM_LINE).match(line)
+        if not m:
+            raise _Unsupported(line)
+        indent, terms, args = m.groups()
+        terms = [t.strip() for t in terms.split('|') if t.strip()]
+        args = [a.strip() for a in (args or '').split(',') if a.strip()]
+        if '\t' in line and any(re.search(r'\s', a) for a in args):
+            raise _Unsupported(line)  # deprecated spaces in terms
+        if not terms:
+            raise _Unsupported(line)
+        depth = len(indent)
+        if '<INHERIT>' in args:
+            if depth - 1 not in last_args_at_depth:
+                raise _Unsupported(line)
+            args = [a for arg in args for a in (last_args_at_depth[depth - 1] if arg == '<INHERIT>' else [arg])]
+        _check_arguments(args)
+        term = terms[0][1:] if terms[0].startswith('!') else terms[0]
+        if term not in SPECIAL_RELATION_TYPES:
+            term = NON_STORAGE_CHAR.sub('_', term.replace(' ', '_'))
+        node = _Node(term)
+        if depth == 0:
+            root_nodes.append(node)
+        elif depth - 1 in last_node_at_depth:
+            last_node_at_depth[depth - 1].children.append(node)
+        else:
+            raise _Unsupported(line)  # no parent
+        last_node_at_depth[depth] = node
+        last_args_at_depth[depth] = args
+    return root_nodes
+
+
+def parse_entity_types(config_str):
+    """
+    Storage forms of the entity types in the given annotation.conf content, in the order of
+    `ProjectConfiguration.get_entity_types` (pre-order of the type hierarchy). Raises _Unsupported if brat would reject
+    the configuration.
+    """
+    collected = []
+    for section, lines in section_lines(config_str).items():
+        root_nodes = parse_section(lines, section)
+        if section == ENTITY_SECTION:
+            for node in root_nodes:
+                node.collect(collected)
+    return collected
+
+
+def read_entity_types(project_root):
+    """
+    Entity types of the project, identical to `ProjectConfiguration(project_root).get_entity_types()`.
+    """
+    try:
+        with open(os.path.join(project_root, ANNOTATION_CONFIG), encoding='utf8') as fin:
+            return parse_entity_types(fin.read())
+    except (OSError, ValueError):  # includes _Unsupported and UnicodeDecodeError
+        from bratsubset.projectconfig import ProjectConfiguration  # slow import
+
+        return ProjectConfiguration(project_root).get_entity_types()
@@ -0,0 +1,90 @@
+"""
+Stage-level instrumentation of agreement runs: a `Profile` collects wall time, calls, bytes read and documents per stage
+(scanning, configuration, parsing, tokenization, comparison, accumulation, reporting, ...).
+
+Instrumented code uses `stage(profile, name)`, which does nothing if no profile is given.
+"""
+import json
+import time
+from collections import OrderedDict
+
+FIELDS = ('seconds', 'calls', 'bytes_read', 'documents')
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profile, name):
+        self._profile = profile
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.add(self._name, seconds=time.perf_counter() - self._start, calls=1)
+        return False
+
+
+def stage(profile, name):
+    """
+    Context manager adding its wall time and one call to the given stage of the profile (if any).
+    """
+    if profile is None:
+        return _NULL_STAGE
+    return _Stage(profile, name)
+
+
+class Profile:
+    """
+    Collector of per-stage statistics (in order of first occurrence). Times of stages run in worker processes are summed
+    over workers.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+
+    def add(self, name, seconds=0.0, calls=0, bytes_read=0, documents=0):
+        record = self.stages.setdefault(name, dict.fromkeys(FIELDS, 0))
+        record['seconds'] += seconds
+        record['calls'] += calls
+        record['bytes_read'] += bytes_read
+        record['documents'] += documents
+
+    def merge(self, other):
+        """
+        Adds the stages of another profile (or its `to_dict`), e.g. one collected in a worker process.
+        """
+        stages = other.stages if isinstance(other, Profile) else other
+        for name, record in stages.items():
+            self.add(name, **record)
+
+    def to_dict(self):
+        return OrderedDict((name, dict(record)) for name, record in self.stages.items())
+
+    def save(self, path):
+        with open(path, 'w') as fout:
+            json.dump(self.to_dict(), fout, indent=2)
+
+    def table(self):
+        """
+        Breakdown as GitHub-flavored markdown table.
+        """
+        from tabulate import tabulate
+
+        total = sum(record['seconds'] for record in self.stages.values())
+        rows = [(name, record['seconds'], 100 * record['seconds'] / total if total else 0.0, record['calls'],
+                 record['bytes_read'] / 2 ** 20, record['documents'])
+                for name, record in self.stages.items()]
+        headers = ['Stage', 'Seconds', '%', 'Calls', 'MB read', 'Documents']
+        return tabulate(rows, headers=headers, tablefmt='github', floatfmt=('', '.3f', '.1f', '', '.2f', ''))
@@ -0,0 +1,60 @@
+"""
+Progress reporting of agreement runs: the evaluation calls a progress callback with a `Progress` tuple after each
+document, `ProgressLine` renders these as a single, regularly updated line with throughput and ETA.
+"""
+import sys
+import time
+from collections import namedtuple
+
+# documents evaluated so far, total number of documents, ANN files and bytes (ANN and text files) read so far (none for
+# documents answered by the count cache)
+Progress = namedtuple('Progress', ['documents_done', 'documents_total', 'files_parsed', 'bytes_read'])
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}'
+
+
+class ProgressLine:
+    """
+    Progress callback writing documents/s, MB/s and ETA to a stream (stderr by default), at most once per interval
+    (in seconds) and once when all documents are done.
+    """
+
+    def __init__(self, stream=None, interval=0.2):
+        self._stream = stream or sys.stderr
+        self._interval = interval
+        self._start = None
+        self._last_update = None
+        self._width = 0
+
+    def __call__(self, progress):
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        done = progress.documents_done >= progress.documents_total
+        if not done and self._last_update is not None and now - self._last_update < self._interval:
+            return
+        self._last_update = now
+        line = self.format(progress, now - self._start)
+        # overwrite remainders of longer previous lines
+        self._stream.write('\r' + line.ljust(self._width) + ('\n' if done else ''))
+        self._width = len(line)
+        self._stream.flush()
+
+    @staticmethod
+    def format(progress, elapsed):
+        done, total = progress.documents_done, progress.documents_total
+        percent = 100 * done / total if total else 100.0
+        docs_per_second = done / elapsed if elapsed > 0 else 0.0
+        mb_per_second = progress.bytes_read / 2 ** 20 / elapsed if elapsed > 0 else 0.0
+        if done >= total:
+            eta = f'done in {format_duration(elapsed)}'
+        elif docs_per_second > 0:
+            eta = f'ETA {format_duration((total - done) / docs_per_second)}'
+        else:
+            eta = 'ETA -:--:--'
+        return (f'{done}/{total} documents ({percent:.1f}%), {progress.files_parsed} files, '
+                f'{docs_per_second:.1f} docs/s, {mb_per_second:.2f} MB/s, {eta}')
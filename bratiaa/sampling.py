@@ -0,0 +1,124 @@
+"""
+Agreement estimates from a stratified random sample of documents: documents are drawn in batches of growing size,
+proportionally to the size of their strata (by default the directory of the document), until the bootstrap confidence
+interval of the total F1 agreement is narrow enough.
+"""
+import os
+import warnings
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+# target width of the confidence interval of the total F1, confidence level, documents of the first round (later rounds
+# double the sample), bootstrap resamples, random seed and function mapping a Document to its stratum (None: directory
+# of the document)
+Sampling = namedtuple('Sampling', ['width', 'confidence', 'batch_size', 'bootstraps', 'seed', 'stratum_func'])
+Sampling.__new__.__defaults__ = (0.02, 0.95, 100, 1000, None, None)
+
+# estimated mean F1 of all pairs (total and per label) with confidence interval bounds (lower, upper)
+Estimate = namedtuple('Estimate', ['total', 'total_ci', 'per_label', 'per_label_ci', 'documents_sampled',
+                                   'documents_total', 'strata', 'confidence', 'bootstraps'])
+
+# bootstrap resamples evaluated at once
+_CHUNK_SIZE = 100
+
+
+def directory_stratum(document):
+    return os.path.dirname(document.doc_id)
+
+
+class StratifiedSample:
+    """
+    Random order of the documents within each stratum, from which batches are drawn without replacement such that each
+    stratum is represented in proportion to its size (and by at least one document).
+    """
+
+    def __init__(self, documents, stratum_func=None, rng=None):
+        stratum_func = stratum_func or directory_stratum
+        rng = rng or np.random.default_rng()
+        self._strata = OrderedDict()
+        for document in documents:
+            self._strata.setdefault(stratum_func(document), []).append(document)
+        for members in self._strata.values():
+            rng.shuffle(members)
+        self._sampled = dict.fromkeys(self._strata, 0)
+        self._num_documents = len(documents)
+
+    @property
+    def num_sampled(self):
+        return sum(self._sampled.values())
+
+    @property
+    def num_documents(self):
+        return self._num_documents
+
+    @property
+    def exhausted(self):
+        return self.num_sampled == self._num_documents
+
+    def draw(self, batch_size):
+        """
+        Next batch of about batch_size documents (fewer, if the sample is exhausted).
+        """
+        batch, target = [], self.num_sampled
+        while not batch and not self.exhausted:
+            target = min(target + batch_size, self._num_documents)
+            for stratum, members in self._strata.items():
+                size = min(len(members), max(1, len(members) * target // self._num_documents))
+                batch.extend(members[self._sampled[stratum]:size])
+                self._sampled[stratum] = max(size, self._sampled[stratum])
+        return batch
+
+    def design(self, doc_ids):
+        """
+        Stratum indices and weights (documents in stratum / sampled documents of stratum) of the given sampled
+        documents, and for each stratum whether it is completely sampled.
+        """
+        doc2stratum = {document.doc_id: i for i, (stratum, members) in enumerate(self._strata.items())
+                       for document in members[:self._sampled[stratum]]}
+        sizes = np.array([len(members) for members in self._strata.values()])
+        sampled = np.array(list(self._sampled.values()))
+        strata = np.array([doc2stratum[doc_id] for doc_id in doc_ids], dtype=np.intp)
+        return strata, sizes[strata] / sampled[strata], sampled == sizes
+
+
+def _mean_f1(pcl):
+    """
+    Mean F1 of all pairs with defined F1 per label and in total for (..., pair, count, label) counts.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_label = 2 * pcl[..., 0, :] / pcl[..., 1, :]
+        pc = pcl.sum(axis=-1)
+        total = 2 * pc[..., 0] / pc[..., 1]
+        return (np.nansum(total, axis=-1) / np.sum(~np.isnan(total), axis=-1),
+                np.nansum(per_label, axis=-2) / np.sum(~np.isnan(per_label), axis=-2))
+
+
+def bootstrap_estimate(pdcl, strata, weights, complete, sampling, rng, documents_total):
+    """
+    Estimate of the mean F1 (total and per label) from the (pair, document, count, label) counts of sampled documents
+    with given stratum indices and weights. Confidence intervals are percentiles of bootstrap resamples within strata,
+    completely sampled strata are not resampled.
+    """
+    num_pairs, num_documents, _, num_labels = pdcl.shape
+    dx = pdcl.transpose(1, 0, 2, 3).reshape(num_documents, -1).astype(np.float64)  # document x (pair, count, label)
+    total, per_label = _mean_f1((weights @ dx).reshape(num_pairs, 2, num_labels))
+    members = [np.flatnonzero(strata == stratum) for stratum in range(len(complete))]
+    total_samples, per_label_samples = [], []
+    for start in range(0, sampling.bootstraps, _CHUNK_SIZE):
+        size = min(_CHUNK_SIZE, sampling.bootstraps - start)
+        multiplicity = np.ones((size, num_documents))
+        for stratum, docs in enumerate(members):
+            if len(docs) and not complete[stratum]:
+                multiplicity[:, docs] = rng.multinomial(len(docs), np.full(len(docs), 1 / len(docs)), size=size)
+        sample_total, sample_per_label = _mean_f1(((multiplicity * weights) @ dx).reshape(size, num_pairs, 2,
+                                                                                            num_labels))
+        total_samples.append(sample_total)
+        per_label_samples.append(sample_per_label)
+    alpha = 100 * (1 - sampling.confidence) / 2
+    with warnings.catch_warnings():  # labels without annotations in the sample
+        warnings.simplefilter('ignore', RuntimeWarning)
+        total_ci = np.nanpercentile(np.concatenate(total_samples), [alpha, 100 - alpha])
+        per_label_ci = np.nanpercentile(np.concatenate(per_label_samples), [alpha, 100 - alpha], axis=0)
+    return Estimate(total, tuple(total_ci), per_label, (per_label_ci[0], per_label_ci[1]), num_documents,
+                    documents_total, len(complete), sampling.confidence, sampling.bootstraps)
@@ -0,0 +1,63 @@
+"""
+Fast discovery of ANN files based on `os.scandir`, keeping paths as plain strings.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def _is_hidden(name):
+    return name.startswith('.')
+
+
+def list_subdirectories(directory):
+    """
+    Sorted names of the non-hidden subdirectories of given directory.
+    """
+    with os.scandir(directory) as entries:
+        return sorted(entry.name for entry in entries if not _is_hidden(entry.name) and entry.is_dir())
+
+
+def _scan_directory(prefix, path):
+    """
+    Lists ANN files (relative paths with given prefix) and subdirectories (prefix, path) of one directory.
+    """
+    files, subdirs = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name
+            if _is_hidden(name):
+                continue
+            if name.endswith('.ann') and entry.is_file():
+                files.append(prefix + name)
+            elif entry.is_dir():
+                subdirs.append((prefix + name + '/', entry.path))
+    return files, subdirs
+
+
+def scan_ann_files(directories, threads=None):
+    """
+    Maps each directory to the relative POSIX paths of all ANN files below it, pruning hidden files and directories.
+
+    With threads > 1, directories are listed (and their entries stat'ed, if the file system does not report entry
+    types) concurrently in a thread pool, which pays off on slow network file systems.
+    """
+    rel_paths = {directory: [] for directory in directories}
+    tasks = [(directory, '', directory) for directory in directories]
+    if not threads or threads < 2:
+        while tasks:
+            directory, prefix, path = tasks.pop()
+            files, subdirs = _scan_directory(prefix, path)
+            rel_paths[directory].extend(files)
+            tasks.extend((directory, sub_prefix, sub_path) for sub_prefix, sub_path in subdirs)
+        return rel_paths
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = {executor.submit(_scan_directory, prefix, path): directory for directory, prefix, path in tasks}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                files, subdirs = future.result()
+                rel_paths[directory].extend(files)
+                for sub_prefix, sub_path in subdirs:
+                    pending[executor.submit(_scan_directory, sub_prefix, sub_path)] = directory
+    return rel_paths
@@ -1,4 +1,5 @@
 import re
+import warnings
 
 import numpy as np
 
@@ -21,14 +22,50 @@ class TokenOverlap:
     """
     Data structure for quick lookup of tokens overlapping with given span.
     Assumes that the provided list of tokens is sorted by indices!
+
+    Only keeps the token start and end offsets as sorted int32 arrays and answers lookups with binary search.
     """
 
     def __init__(self, text, tokens):
-        self.tokens = tokens
-        self.char2token = self.compute_mapping(len(text), tokens)
+        self.text_length = len(text)
+        offsets = np.array(tokens, dtype=np.int32).reshape(-1, 2)
+        self.starts = np.ascontiguousarray(offsets[:, 0])
+        self.ends = np.ascontiguousarray(offsets[:, 1])
+
+    @classmethod
+    def from_offsets(cls, text_length, starts, ends):
+        """
+        Creates the lookup from sorted arrays of token start and end offsets (e.g. memory-mapped).
+        """
+        token_overlap = cls.__new__(cls)
+        token_overlap.text_length = text_length
+        token_overlap.starts = starts
+        token_overlap.ends = ends
+        return token_overlap
+
+    @property
+    def tokens(self):
+        """
+        List of (start, end) tuples, built on access.
+        """
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    @property
+    def char2token(self):
+        """
+        Deprecated: index of the token at or before each character (-1 before the first token), built on access.
+        """
+        warnings.warn('TokenOverlap.char2token is deprecated, use token_range instead', DeprecationWarning,
+                      stacklevel=2)
+        return self.compute_mapping(self.text_length, self.tokens)
 
     @staticmethod
     def compute_mapping(text_length, tokens):
+        """
+        Deprecated: per-character token index (see `char2token`).
+        """
+        warnings.warn('TokenOverlap.compute_mapping is deprecated, use token_range instead', DeprecationWarning,
+                      stacklevel=2)
         char2token = np.zeros(text_length, dtype=int)
         i = 0
         for token_idx, (start, end) in enumerate(tokens):
@@ -39,15 +76,33 @@ class TokenOverlap:
         return char2token
 
     def overlapping_tokens(self, start, end):
-        assert end <= len(self.char2token), f'End index {end} > text length {len(self.char2token)}!'
+        first, last = self.token_range(start, end)
+        return list(zip(self.starts[first:last].tolist(), self.ends[first:last].tolist()))
+
+    def token_range(self, start, end):
+        """
+        Indices [first, last) of the tokens overlapping with given span (first == last if there are none).
+        """
+        assert end <= self.text_length, f'End index {end} > text length {self.text_length}!'
         if end < 1 or start >= end:
-            return []
-        start_token = self.char2token[start]
-        if start_token == -1: # start offset before first token
-            start_token = 0
-        if self.tokens[start_token][1] <= start: # start offset between two tokens
-            start_token += 1
-        end_token = self.char2token[end - 1] # end offset is exclusive
-        if end_token < 0 or end_token < start_token:
-            return []
-        return self.tokens[start_token:end_token + 1]
+            return 0, 0
+        first = int(np.searchsorted(self.ends, start, side='right'))  # tokens ending before or at start
+        last = int(np.searchsorted(self.starts, end - 1, side='right'))  # tokens starting before end
+        if last <= first:
+            return 0, 0
+        return first, last
+
+    def token_ranges(self, starts, ends):
+        """
+        Batched `token_range` for arrays of span offsets, returns arrays of first and last (exclusive) token indices.
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        assert not len(ends) or ends.max() <= self.text_length, \
+            f'End index {ends.max()} > text length {self.text_length}!'
+        first = np.searchsorted(self.ends, starts, side='right')
+        last = np.searchsorted(self.starts, ends - 1, side='right')
+        empty = (ends < 1) | (starts >= ends) | (last <= first)
+        first[empty] = 0
+        last[empty] = 0
+        return first, last
@@ -12,8 +12,10 @@ Author:     Illes Solt          <solt tmit bme hu>
 Version:    2011-08-15
 """
 
+import os
 import re
 import sys
+from collections import OrderedDict
 import urllib.parse  # TODO reduce scope
 import urllib.robotparser  # TODO reduce scope
 
@@ -28,6 +30,74 @@ class InvalidProjectConfigException(Exception):
     pass
 
 
+# default maximum number of entries of the configuration cache
+DEFAULT_CONFIG_CACHE_SIZE = 1024
+
+
+def file_signature(paths):
+    """Tuple of (mtime, size) of the given files, None for missing ones."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class ConfigCache:
+    """LRU cache of values derived from configuration files, shared by all
+    configuration getters. Entries are validated against the mtime and size
+    of the files they were derived from and recomputed if these changed."""
+
+    def __init__(self, maxsize=DEFAULT_CONFIG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def get(self, key, paths, compute):
+        signature = file_signature(paths)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.invalidations += 1
+        self.misses += 1
+        value = compute()
+        self._entries[key] = (signature, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return ('Config cache: %d hits, %d misses (%.1f%% hit rate), '
+                '%d invalidations, %d evictions, %d entries' %
+                (self.hits, self.misses, 100 * rate, self.invalidations,
+                 self.evictions, len(self._entries)))
+
+
+CONFIG_CACHE = ConfigCache()
+
+
 # names of files in which various configs are found
 __access_control_filename = 'acl.conf'
 __annotation_config_filename = 'annotation.conf'
@@ -664,6 +734,18 @@ def __parse_configs(configstr, source, expected_sections, optional_sections):
     return (configs, section_labels)
 
 
+def __config_paths(directory, filename):
+    # the config file of the directory and the fallback one (see get_configs)
+    return (os.path.join(directory, filename), filename)
+
+
+def __cached(name, directory, filename, compute, *key):
+    """Value of compute() cached in CONFIG_CACHE under (name, directory,
+    *key), valid while the config file of given filename is unchanged."""
+    return CONFIG_CACHE.get((name, directory) + key,
+                            __config_paths(directory, filename), compute)
+
+
 def get_configs(
         directory,
         filename,
@@ -671,7 +753,7 @@ def get_configs(
         minconf,
         sections,
         optional_sections):
-    if (directory, filename) not in get_configs.__cache:
+    def compute():
         configstr, source = __read_first_in_directory_tree(directory, filename)
 
         if configstr is None:
@@ -714,12 +796,9 @@ def get_configs(
                     r.special_arguments["<REL-TYPE>"] = ["symmetric",
                                                          "transitive"]
 
-        get_configs.__cache[(directory, filename)] = (configs, section_labels)
-
-    return get_configs.__cache[(directory, filename)]
+        return (configs, section_labels)
 
-
-get_configs.__cache = {}
+    return __cached('get_configs', directory, filename, compute, filename)
 
 
 def __get_access_control(directory, filename, default_rules):
@@ -838,8 +917,7 @@ def get_annotation_config_section_labels(directory):
 
 
 def get_labels(directory):
-    cache = get_labels.__cache
-    if directory not in cache:
+    def compute():
         l = {}
         for t in get_visual_configs(directory)[0][LABEL_SECTION]:
             if t.storage_form() in l:
@@ -848,27 +926,22 @@ def get_labels(directory):
                     t.storage_form(), -1)
             # first is storage for, rest are labels.
             l[t.storage_form()] = t.terms[1:]
-        cache[directory] = l
-    return cache[directory]
-
+        return l
 
-get_labels.__cache = {}
+    return __cached('get_labels', directory, __visual_config_filename, compute)
 
 
 # TODO: too much caching?
 
 
 def get_drawing_types(directory):
-    cache = get_drawing_types.__cache
-    if directory not in cache:
+    def compute():
         l = set()
         for n in get_drawing_config(directory):
             l.add(n.storage_form())
-        cache[directory] = list(l)
-    return cache[directory]
-
+        return list(l)
 
-get_drawing_types.__cache = {}
+    return __cached('get_drawing_types', directory, __visual_config_filename, compute)
 
 
 def get_option_config(directory):
@@ -908,32 +981,24 @@ def get_tools_config_section_labels(directory):
 
 
 def get_access_control(directory):
-    cache = get_access_control.__cache
-    if directory not in cache:
+    def compute():
         a = __get_access_control(directory,
                                  __access_control_filename,
                                  __default_access_control)
-        cache[directory] = a
+        return a
 
-    return cache[directory]
-
-
-get_access_control.__cache = {}
+    return __cached('get_access_control', directory, __access_control_filename, compute)
 
 
 def get_kb_shortcuts(directory):
-    cache = get_kb_shortcuts.__cache
-    if directory not in cache:
+    def compute():
         a = __get_kb_shortcuts(directory,
                                __kb_shortcut_filename,
                                __default_kb_shortcuts,
                                {"P": "Positive_regulation"})
-        cache[directory] = a
-
-    return cache[directory]
+        return a
 
-
-get_kb_shortcuts.__cache = {}
+    return __cached('get_kb_shortcuts', directory, __kb_shortcut_filename, compute)
 
 
 def __collect_type_list(node, collected):
@@ -956,102 +1021,52 @@ def __type_hierarchy_to_list(hierarchy):
     return types
 
 
-# TODO: it's not clear it makes sense for all of these methods to have
-# their own caches; this seems a bit like a case of premature
-# optimization to me. Consider simplifying.
+# derived values are cached in the shared CONFIG_CACHE along with the
+# configs they are derived from (see __cached).
 
 
 def get_entity_type_list(directory):
-    cache = get_entity_type_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_entity_type_hierarchy(directory))
-    return cache[directory]
-
-
-get_entity_type_list.__cache = {}
+    return __cached('get_entity_type_list', directory, __annotation_config_filename,
+                    lambda: __type_hierarchy_to_list(get_entity_type_hierarchy(directory)))
 
 
 def get_event_type_list(directory):
-    cache = get_event_type_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_event_type_hierarchy(directory))
-    return cache[directory]
-
-
-get_event_type_list.__cache = {}
+    return __cached('get_event_type_list', directory, __annotation_config_filename,
+                    lambda: __type_hierarchy_to_list(get_event_type_hierarchy(directory)))
 
 
 def get_relation_type_list(directory):
-    cache = get_relation_type_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_relation_type_hierarchy(directory))
-    return cache[directory]
-
-
-get_relation_type_list.__cache = {}
+    return __cached('get_relation_type_list', directory, __annotation_config_filename,
+                    lambda: __type_hierarchy_to_list(get_relation_type_hierarchy(directory)))
 
 
 def get_attribute_type_list(directory):
-    cache = get_attribute_type_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_attribute_type_hierarchy(directory))
-    return cache[directory]
-
-
-get_attribute_type_list.__cache = {}
+    return __cached('get_attribute_type_list', directory, __annotation_config_filename,
+                    lambda: __type_hierarchy_to_list(get_attribute_type_hierarchy(directory)))
 
 
 def get_search_config_list(directory):
-    cache = get_search_config_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_search_config(directory))
-    return cache[directory]
-
-
-get_search_config_list.__cache = {}
+    return __cached('get_search_config_list', directory, __tools_config_filename,
+                    lambda: __type_hierarchy_to_list(get_search_config(directory)))
 
 
 def get_annotator_config_list(directory):
-    cache = get_annotator_config_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_annotator_config(directory))
-    return cache[directory]
-
-
-get_annotator_config_list.__cache = {}
+    return __cached('get_annotator_config_list', directory, __tools_config_filename,
+                    lambda: __type_hierarchy_to_list(get_annotator_config(directory)))
 
 
 def get_disambiguator_config_list(directory):
-    cache = get_disambiguator_config_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_disambiguator_config(directory))
-    return cache[directory]
-
-
-get_disambiguator_config_list.__cache = {}
+    return __cached('get_disambiguator_config_list', directory, __tools_config_filename,
+                    lambda: __type_hierarchy_to_list(get_disambiguator_config(directory)))
 
 
 def get_normalization_config_list(directory):
-    cache = get_normalization_config_list.__cache
-    if directory not in cache:
-        cache[directory] = __type_hierarchy_to_list(
-            get_normalization_config(directory))
-    return cache[directory]
-
-
-get_normalization_config_list.__cache = {}
+    return __cached('get_normalization_config_list', directory, __tools_config_filename,
+                    lambda: __type_hierarchy_to_list(get_normalization_config(directory)))
 
 
 def get_node_by_storage_form(directory, term):
-    cache = get_node_by_storage_form.__cache
-    if directory not in cache:
+    def compute():
         d = {}
         for e in get_entity_type_list(
                 directory) + get_event_type_list(directory):
@@ -1061,16 +1076,13 @@ def get_node_by_storage_form(directory, term):
                     "Project configuration: term %s appears multiple times, only using last. Configuration may be wrong." %
                     t, 5)
             d[t] = e
-        cache[directory] = d
-
-    return cache[directory].get(term, None)
-
+        return d
 
-get_node_by_storage_form.__cache = {}
+    return __cached('get_node_by_storage_form', directory, __annotation_config_filename, compute).get(term, None)
 
 
-def _get_option_by_storage_form(directory, term, config, cache):
-    if directory not in cache:
+def _get_option_by_storage_form(directory, term, config, name):
+    def compute():
         d = {}
         for n in config:
             t = n.storage_form()
@@ -1085,28 +1097,23 @@ def _get_option_by_storage_form(directory, term, config, cache):
                         "Project configuration: %s key %s has multiple values, only using first. Configuration may be wrong." %
                         (t, a), 5)
                 d[t][a] = n.arguments[a][0]
+        return d
 
-        cache[directory] = d
-
-    return cache[directory].get(term, None)
+    filename = {'get_option_config_by_storage_form': __tools_config_filename,
+                'get_visual_option_config_by_storage_form': __visual_config_filename}[name]
+    return __cached(name, directory, filename, compute).get(term, None)
 
 
 def get_option_config_by_storage_form(directory, term):
-    cache = get_option_config_by_storage_form.__cache
     config = get_option_config(directory)
-    return _get_option_by_storage_form(directory, term, config, cache)
-
-
-get_option_config_by_storage_form.__cache = {}
+    return _get_option_by_storage_form(
+        directory, term, config, 'get_option_config_by_storage_form')
 
 
 def get_visual_option_config_by_storage_form(directory, term):
-    cache = get_visual_option_config_by_storage_form.__cache
     config = get_visual_option_config(directory)
-    return _get_option_by_storage_form(directory, term, config, cache)
-
-
-get_visual_option_config_by_storage_form.__cache = {}
+    return _get_option_by_storage_form(
+        directory, term, config, 'get_visual_option_config_by_storage_form')
 
 
 # access for settings for specific options in tools.conf
@@ -1147,8 +1154,7 @@ def visual_options_get_text_direction(directory):
 
 
 def get_drawing_config_by_storage_form(directory, term):
-    cache = get_drawing_config_by_storage_form.__cache
-    if directory not in cache:
+    def compute():
         d = {}
         for n in get_drawing_config(directory):
             t = n.storage_form()
@@ -1206,12 +1212,9 @@ def get_drawing_config_by_storage_form(directory, term):
                 if d[t][k] == '<EMPTY>':
                     d[t][k] = ''
 
-        cache[directory] = d
-
-    return cache[directory].get(term, None)
+        return d
 
-
-get_drawing_config_by_storage_form.__cache = {}
+    return __cached('get_drawing_config_by_storage_form', directory, __visual_config_filename, compute).get(term, None)
 
 
 def __directory_relations_by_arg_num(
@@ -1257,62 +1260,52 @@ def __directory_relations_by_arg_num(
 
 
 def get_relations_by_arg1(directory, atype, include_special=False):
-    cache = get_relations_by_arg1.__cache
-    cache[directory] = cache.get(directory, {})
-    if (atype, include_special) not in cache[directory]:
-        cache[directory][(atype, include_special)] = __directory_relations_by_arg_num(
-            directory, 0, atype, include_special)
-    return cache[directory][(atype, include_special)]
-
-
-get_relations_by_arg1.__cache = {}
+    return __cached('get_relations_by_arg1', directory,
+                    __annotation_config_filename,
+                    lambda: __directory_relations_by_arg_num(
+                        directory, 0, atype, include_special),
+                    atype, include_special)
 
 
 def get_relations_by_arg2(directory, atype, include_special=False):
-    cache = get_relations_by_arg2.__cache
-    cache[directory] = cache.get(directory, {})
-    if (atype, include_special) not in cache[directory]:
-        cache[directory][(atype, include_special)] = __directory_relations_by_arg_num(
-            directory, 1, atype, include_special)
-    return cache[directory][(atype, include_special)]
-
-
-get_relations_by_arg2.__cache = {}
+    return __cached('get_relations_by_arg2', directory,
+                    __annotation_config_filename,
+                    lambda: __directory_relations_by_arg_num(
+                        directory, 1, atype, include_special),
+                    atype, include_special)
 
 
 def get_relations_by_storage_form(directory, rtype, include_special=False):
-    cache = get_relations_by_storage_form.__cache
-    cache[directory] = cache.get(directory, {})
-    if include_special not in cache[directory]:
-        cache[directory][include_special] = {}
+    def compute():
+        d = {}
         for r in get_relation_type_list(directory):
             if (r.storage_form() in SPECIAL_RELATION_TYPES and
                     not include_special):
                 continue
             if r.unused:
                 continue
-            if r.storage_form() not in cache[directory][include_special]:
-                cache[directory][include_special][r.storage_form()] = []
-            cache[directory][include_special][r.storage_form()].append(r)
-    return cache[directory][include_special].get(rtype, [])
+            if r.storage_form() not in d:
+                d[r.storage_form()] = []
+            d[r.storage_form()].append(r)
+        return d
 
-
-get_relations_by_storage_form.__cache = {}
+    return __cached('get_relations_by_storage_form', directory,
+                    __annotation_config_filename, compute,
+                    include_special).get(rtype, [])
 
 
 def get_labels_by_storage_form(directory, term):
-    cache = get_labels_by_storage_form.__cache
-    if directory not in cache:
-        cache[directory] = {}
+    def compute():
+        d = {}
         for l, labels in list(get_labels(directory).items()):
             # recognize <EMPTY> as specifying that a label should
             # be the empty string
             labels = [lab if lab != '<EMPTY>' else ' ' for lab in labels]
-            cache[directory][l] = labels
-    return cache[directory].get(term, None)
-
+            d[l] = labels
+        return d
 
-get_labels_by_storage_form.__cache = {}
+    return __cached('get_labels_by_storage_form', directory,
+                    __visual_config_filename, compute).get(term, None)
 
 # fallback for missing or partial config: these are highly likely to
 # be entity (as opposed to an event or relation) types.
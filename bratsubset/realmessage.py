@@ -15,7 +15,9 @@ Author:     Sampo Pyysalo       <smp is s u-tokyo ac jp>
 Version:    2011-05-31
 """
 
+import logging
 import re
+from collections import OrderedDict
 
 # for cleaning up control chars from a string, from
 # http://stackoverflow.com/questions/92438/stripping-non-printable-characters-from-a-string-in-python
@@ -29,8 +31,74 @@ def remove_control_chars(s):
     return __control_char_re.sub('', s)
 
 
+# default maximum number of distinct messages kept by the buffer sink
+DEFAULT_MAXLEN = 1000
+
+# logging levels of message types for the logging sink
+__log_levels = {
+    'comment': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'debug': logging.DEBUG,
+}
+
+
+def log_level(type):
+    return __log_levels.get(type, logging.WARNING)
+
+
+class MessageBuffer:
+    """Ring buffer of distinct (message, type, duration, escaped) tuples
+    with counts of duplicates. If more than maxlen distinct messages are
+    added, the oldest ones are dropped (maxlen None: unbounded)."""
+
+    def __init__(self, maxlen=DEFAULT_MAXLEN):
+        self.maxlen = maxlen
+        self.counts = OrderedDict()
+        self.dropped = 0
+
+    def add(self, message):
+        if message in self.counts:
+            self.counts[message] += 1
+            return
+        self.counts[message] = 1
+        if self.maxlen is not None and len(self.counts) > self.maxlen:
+            _, count = self.counts.popitem(last=False)
+            self.dropped += count
+
+    def drain(self):
+        counts, dropped = self.counts, self.dropped
+        self.counts, self.dropped = OrderedDict(), 0
+        return counts, dropped
+
+    def __len__(self):
+        return len(self.counts)
+
+
 class Messager:
-    __pending_messages = []
+    # one of 'buffer' (default), 'logging' and 'off', see configure()
+    __sink = 'buffer'
+    __pending_messages = MessageBuffer()
+    __logger = logging.getLogger('bratsubset')
+
+    def configure(sink='buffer', maxlen=DEFAULT_MAXLEN, logger=None):
+        """Sets the sink of messages: 'buffer' keeps up to maxlen distinct
+        messages with counts of duplicates until output_json or clear is
+        called, 'logging' forwards messages (unescaped) to the given logger
+        (default: 'bratsubset'), 'off' discards them. Pending messages are
+        discarded."""
+        if sink not in ('buffer', 'logging', 'off'):
+            raise ValueError('unknown message sink: %s' % sink)
+        Messager.__sink = sink
+        Messager.__pending_messages = MessageBuffer(maxlen)
+        if logger is not None:
+            Messager.__logger = logger
+    configure = staticmethod(configure)
+
+    def pending():
+        """Number of distinct buffered messages."""
+        return len(Messager.__pending_messages)
+    pending = staticmethod(pending)
 
     def info(msg, duration=3, escaped=False):
         Messager.__message(msg, 'comment', duration, escaped)
@@ -49,9 +117,23 @@ class Messager:
         Messager.__message(msg, 'debug', duration, escaped)
     debug = staticmethod(debug)
 
+    def clear():
+        """Discards the buffered messages."""
+        Messager.__pending_messages.drain()
+    clear = staticmethod(clear)
+
     def output(o):
-        for m, c, d in Messager.__pending_messages:
+        """Prints the buffered messages to o, keeping them (see clear)."""
+        counts = Messager.__pending_messages.counts
+        dropped = Messager.__pending_messages.dropped
+        for (m, c, d, escaped), count in counts.items():
+            if not escaped:
+                m = Messager.__escape(m)
+            if count > 1:
+                m = '%s [message repeated %d times]' % (m, count)
             print(c, ":", m, file=o)
+        if dropped:
+            print('warning', ':', '[%d older messages dropped]' % dropped, file=o)
     output = staticmethod(output)
 
     def output_json(json_dict):
@@ -67,48 +149,37 @@ class Messager:
     output_json = staticmethod(output_json)
 
     def __output_json(json_dict):
-        # protect against non-unicode inputs
-        convertable_messages = []
-        for m in Messager.__pending_messages:
-            try:
-                m[0].encode('utf-8')
-                convertable_messages.append(m)
-            except UnicodeDecodeError:
-                convertable_messages.append(
-                    ('[ERROR: MESSAGE THAT CANNOT BE ENCODED AS UTF-8 OMITTED]', 'error', 5))
-        Messager.__pending_messages = convertable_messages
-
-        # clean up messages by removing possible control characters
-        # that may cause trouble clientside
-        cleaned_messages = []
-        for s, t, r in Messager.__pending_messages:
+        counts, dropped = Messager.__pending_messages.drain()
+
+        # escaping is deferred until here, such that messages which are
+        # never output cost no escaping
+        escaped_counts = OrderedDict()
+        for (s, t, r, escaped), count in counts.items():
+            if not escaped:
+                s = Messager.__escape(s)
+            # clean up messages by removing possible control characters
+            # that may cause trouble clientside
             cs = remove_control_chars(s)
             if cs != s:
                 s = cs + \
                     '[NOTE: SOME NONPRINTABLE CHARACTERS REMOVED FROM MESSAGE]'
-            cleaned_messages.append((s, t, r))
-        Messager.__pending_messages = cleaned_messages
-
-        # to avoid crowding the interface, combine messages with identical
-        # content
-        msgcount = {}
-        for m in Messager.__pending_messages:
-            msgcount[m] = msgcount.get(m, 0) + 1
+            # to avoid crowding the interface, combine messages with
+            # identical content
+            m = (s, t, r)
+            escaped_counts[m] = escaped_counts.get(m, 0) + count
 
         merged_messages = []
-        for m in Messager.__pending_messages:
-            if m in msgcount:
-                count = msgcount[m]
-                del msgcount[m]
-                s, t, r = m
-                if count > 1:
-                    s = s + '<br/><b>[message repeated %d times]</b>' % count
-                merged_messages.append((s, t, r))
+        for (s, t, r), count in escaped_counts.items():
+            if count > 1:
+                s = s + '<br/><b>[message repeated %d times]</b>' % count
+            merged_messages.append((s, t, r))
+        if dropped:
+            merged_messages.append(
+                ('[%d older messages dropped]' % dropped, 'warning', 3))
 
         if 'messages' not in json_dict:
             json_dict['messages'] = []
         json_dict['messages'] += merged_messages
-        Messager.__pending_messages = []
         return json_dict
     __output_json = staticmethod(__output_json)
 
@@ -118,11 +189,14 @@ class Messager:
     __escape = staticmethod(__escape)
 
     def __message(msg, type, duration, escaped):
-        if not isinstance(msg, str) and not isinstance(msg, str):
+        if Messager.__sink == 'off':
+            return
+        if not isinstance(msg, str):
             msg = str(msg)
-        if not escaped:
-            msg = Messager.__escape(msg)
-        Messager.__pending_messages.append((msg, type, duration))
+        if Messager.__sink == 'logging':
+            Messager.__logger.log(log_level(type), msg)
+            return
+        Messager.__pending_messages.add((msg, type, duration, escaped))
     __message = staticmethod(__message)
 
 
@@ -0,0 +1,29 @@
+import filecmp
+import os
+
+from benchmarks.generate import ProjectSpec, generate_project
+from bratiaa.agree import compute_f1_agreement, input_generator
+
+
+def test_deterministic(tmp_path):
+    spec = ProjectSpec(annotators=2, documents=3, tokens=50, seed=7)
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+    generate_project(first, spec)
+    generate_project(second, spec)
+    for directory in ('annotator-0/batch-0', 'annotator-1/batch-0'):
+        _, mismatch, errors = filecmp.cmpfiles(os.path.join(first, directory), os.path.join(second, directory),
+                                               os.listdir(os.path.join(first, directory)), shallow=False)
+        assert not mismatch and not errors
+
+
+def test_layout(tmp_path):
+    root = generate_project(str(tmp_path), ProjectSpec(annotators=3, documents=5, files_per_dir=2))
+    assert sorted(os.listdir(os.path.join(root, 'annotator-2'))) == ['batch-0', 'batch-1', 'batch-2']
+    assert sum(1 for _ in input_generator(root)) == 5
+
+
+def test_disagreement(tmp_path):
+    agreeing = generate_project(str(tmp_path / 'agreeing'), ProjectSpec(disagreement=0.0, discontinuous=0.5))
+    assert compute_f1_agreement(agreeing).mean_sd_total() == (1.0, 0.0)
+    disagreeing = generate_project(str(tmp_path / 'disagreeing'), ProjectSpec(disagreement=0.3))
+    assert compute_f1_agreement(disagreeing).mean_sd_total()[0] < 0.9
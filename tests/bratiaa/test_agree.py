@@ -1,9 +1,12 @@
+import numpy.testing as npt
 import pytest
 
 from bratiaa.agree import *
+from bratiaa.agree import _DocumentInputs
 from bratiaa.utils import tokenize
 
 AGREE_2_ROOT = 'data/agreement/agree-2'
+EXAMPLE_PROJECT = 'example-files/example-project'
 
 
 @pytest.fixture(scope='module')
@@ -43,3 +46,172 @@ def test_token_iaa_report_smoke():
 
 def test_collect_redundant_files():
     assert len(collect_redundant_files(Path(AGREE_2_ROOT), ['ann1', 'ann2'])) == 2
+
+
+def test_each_ann_file_parsed_once():
+    parsed_paths = []
+
+    def parse(ann_path, tokens=None):
+        parsed_paths.append(ann_path)
+        return read_instance_annotations(ann_path)
+
+    evaluation = Evaluation(parse, compare_instance_annotations)
+    f1_agreement = F1Agreement(partial(input_generator, 'example-files/example-project'), ['LOC', 'MISC', 'ORG', 'PER'],
+                               eval_func=evaluation)
+    assert len(parsed_paths) == len(set(parsed_paths)) == 4 * 7
+    assert f1_agreement.mean_sd_total()[0] == pytest.approx(0.8903501)
+
+
+def test_path_based_eval_func(agree_2):
+    def eval_func(ann_path_1, ann_path_2, tokens=None):
+        return exact_match_instance_evaluation(ann_path_1, ann_path_2)
+
+    f1_agreement = F1Agreement(partial(input_generator, AGREE_2_ROOT), agree_2.labels, eval_func=eval_func)
+    assert f1_agreement.mean_sd_total() == agree_2.mean_sd_total()
+
+
+def test_single_traversal(agree_2):
+    traversals = []
+
+    def input_gen(root):
+        traversals.append(root)
+        yield from input_generator(root)
+
+    f1_agreement = compute_f1_agreement(AGREE_2_ROOT, input_gen=input_gen)
+    assert traversals == [AGREE_2_ROOT]
+    assert f1_agreement.mean_sd_total() == agree_2.mean_sd_total()
+
+
+def test_one_shot_generator(agree_2):
+    f1_agreement = F1Agreement(input_generator(AGREE_2_ROOT), agree_2.labels)
+    assert f1_agreement.documents == agree_2.documents
+    assert f1_agreement.mean_sd_total() == agree_2.mean_sd_total()
+
+
+def test_modes_equal_separate_runs():
+    agreements = compute_f1_agreements(EXAMPLE_PROJECT, modes=['instance', 'token'])
+    assert list(agreements) == ['instance', 'token']
+    instance, token = compute_f1_agreement(EXAMPLE_PROJECT), compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize)
+    for agreement, expected in zip(agreements.values(), (instance, token)):
+        assert agreement._token_based == expected._token_based
+        assert agreement.mean_sd_total() == expected.mean_sd_total()
+        assert (agreement._pdcl == expected._pdcl).all()
+
+
+def test_modes_read_each_ann_file_once(monkeypatch):
+    read_paths = []
+    read_bytes = _DocumentInputs._read_bytes
+
+    def read_bytes_spy(inputs, path):
+        read_paths.append(path)
+        return read_bytes(inputs, path)
+
+    monkeypatch.setattr(_DocumentInputs, '_read_bytes', read_bytes_spy)
+    modes = {'instance': Mode(engine='bitmask'), 'token': Mode(token_func=tokenize),
+             'token-bitset': Mode(token_func=tokenize, engine='bitset')}
+    agreements = compute_f1_agreements(EXAMPLE_PROJECT, modes=modes)
+    ann_paths = [path for path in read_paths if str(path).endswith('.ann')]
+    assert len(ann_paths) == len(set(ann_paths)) == 4 * 7
+    assert len(read_paths) - len(ann_paths) == 7  # texts
+    assert agreements['token'].mean_sd_total() == agreements['token-bitset'].mean_sd_total()
+
+
+@pytest.mark.parametrize('per_label', [False, True])
+def test_one_vs_rest_all(per_label):
+    f1_agreement = compute_f1_agreement(EXAMPLE_PROJECT)
+    avg, stddev = f1_agreement.one_vs_rest_all(per_label=per_label)
+    one_vs_rest = (f1_agreement.mean_sd_per_label_one_vs_rest if per_label
+                   else f1_agreement.mean_sd_total_one_vs_rest)
+    for i, annotator in enumerate(f1_agreement.annotators):
+        expected_avg, expected_stddev = one_vs_rest(annotator)
+        assert avg[i] == pytest.approx(expected_avg, nan_ok=True)
+        assert stddev[i] == pytest.approx(expected_stddev, nan_ok=True)
+
+
+@pytest.mark.parametrize('engine', ['pairwise', 'bitmask'])
+def test_reference_pairs_equal_all_pairs_run(tmp_path, engine):
+    full = compute_f1_agreement(EXAMPLE_PROJECT)
+    for cache_dir in (None, tmp_path, tmp_path):  # without cache, cold and warm cache
+        f1_agreement = compute_f1_agreement(EXAMPLE_PROJECT, engine=engine, reference='Max', cache_dir=cache_dir)
+        assert f1_agreement.reference == 'Max'
+        assert f1_agreement._pairs == [('Max', 'Lisa'), ('Max', 'Maria'), ('Max', 'Peter')]
+        expected = full._pdcl[[full._pair2idx[pair] for pair in f1_agreement._pairs]]
+        assert (f1_agreement._pdcl == expected).all()
+        assert f1_agreement.mean_sd_total_one_vs_rest('Max') == full.mean_sd_total_one_vs_rest('Max')
+
+
+def test_reference_f1_matrix():
+    matrix = compute_f1_agreement(EXAMPLE_PROJECT, reference='Max').compute_total_f1_matrix()
+    max_idx = 2
+    assert not np.isnan(matrix[max_idx]).any() and not np.isnan(matrix[:, max_idx]).any()
+    assert np.isnan(matrix).sum() == 6  # pairs without reference
+
+
+def test_reference_save_load(tmp_path):
+    agreements = compute_f1_agreements(EXAMPLE_PROJECT, reference='Peter')
+    for f1_agreement in agreements.values():
+        f1_agreement.save(tmp_path / 'agreement.npz')
+        loaded = F1Agreement.load(tmp_path / 'agreement.npz')
+        assert loaded.reference == 'Peter'
+        assert loaded._pairs == f1_agreement._pairs
+        assert loaded.mean_sd_total() == f1_agreement.mean_sd_total()
+
+
+def test_unknown_reference():
+    with pytest.raises(ValueError, match='Unknown reference annotator'):
+        compute_f1_agreement(EXAMPLE_PROJECT, reference='gold')
+
+
+def test_explicit_pairs():
+    full = compute_f1_agreement(EXAMPLE_PROJECT)
+    pairs = [('Peter', 'Lisa'), ('Maria', 'Max')]
+    f1_agreement = compute_f1_agreement(EXAMPLE_PROJECT, engine='bitmask', pairs=pairs)
+    assert f1_agreement.pairs == pairs
+    assert f1_agreement.sampled_from is None
+    assert (f1_agreement._pdcl == full._pdcl[[full._pair2idx[pair] for pair in pairs]]).all()
+
+
+@pytest.mark.parametrize('pairs, reference', [
+    ([('Lisa', 'gold')], None),
+    ([('Lisa', 'Lisa')], None),
+    ([('Lisa', 'Max'), ('Max', 'Lisa')], None),
+    ([('Lisa', 'Maria')], 'Max'),
+])
+def test_invalid_pairs(pairs, reference):
+    with pytest.raises(ValueError):
+        select_pairs(['Lisa', 'Maria', 'Max', 'Peter'], pairs, reference)
+
+
+def test_sample_pairs():
+    annotators = [f'ann-{i:02d}' for i in range(30)]
+    pairs, sampled_from = select_pairs(annotators, sample_pairs=10, seed=1)
+    assert len(pairs) == len(set(pairs)) == 10 and sampled_from == 435
+    assert select_pairs(annotators, sample_pairs=10, seed=1) == (pairs, sampled_from)
+    assert pairs == sorted(pairs)  # order of combinations
+    assert select_pairs(annotators, sample_pairs=1000) == (list(combinations(annotators, 2)), None)
+    reference_sample, sampled_from = select_pairs(annotators, reference='ann-03', sample_pairs=5, seed=1)
+    assert sampled_from == 29 and all('ann-03' in pair for pair in reference_sample)
+
+
+def test_sampled_report(capsys, tmp_path):
+    agreements = compute_f1_agreements(EXAMPLE_PROJECT, sample_pairs=3, seed=7)
+    instance, token = agreements['instance'], agreements['token']
+    assert instance.pairs == token.pairs and len(instance.pairs) == 3
+    instance.save(tmp_path / 'agreement.npz')
+    loaded = F1Agreement.load(tmp_path / 'agreement.npz')
+    assert (loaded.pairs, loaded.sampled_from) == (instance.pairs, 6)
+    iaa_report(loaded)
+    assert '* Sampled statistics: 3 of 6 annotator pairs drawn at random (seed 7)' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('token_func', [None, tokenize])
+def test_streaming_equals_dense(token_func):
+    dense = compute_f1_agreement(EXAMPLE_PROJECT, token_func=token_func, storage='dense')
+    streaming = compute_f1_agreement(EXAMPLE_PROJECT, token_func=token_func, storage='streaming')
+    assert streaming.streaming and not dense.streaming
+    assert streaming.mean_sd_total() == dense.mean_sd_total()
+    npt.assert_array_equal(streaming.mean_sd_per_label(), dense.mean_sd_per_label())
+    npt.assert_allclose(streaming.mean_sd_documents(), dense.mean_sd_documents())
+    # pooled over all (pair, document) scores
+    f1 = compute_f1(dense._pdcl.sum(axis=3)[:, :, 0], dense._pdcl.sum(axis=3)[:, :, 1])
+    npt.assert_allclose(dense.mean_sd_documents(), (np.nanmean(f1), np.nanstd(f1)))
@@ -28,3 +28,48 @@ def test_single_annotator():
         docs = ['esp.train-doc-29.ann', 'esp.train-doc-46.ann']
         annotators = ['ann1']
         F1Agreement(partial(input_generator, root), labels, annotators=annotators, documents=docs)
+
+
+@pytest.mark.parametrize('args', [['--engine', 'bitset'], ['-t', '--engine', 'bitmask'],
+                                  ['--modes', 'instance', '--engine', 'bitset']])
+def test_cli_unsupported_engine(args, capsys):
+    from bratiaa.agree_cli import parse_args
+
+    with pytest.raises(SystemExit):
+        parse_args(['data/agreement/agree-2'] + args)
+    assert 'does not support' in capsys.readouterr().err
+
+
+def test_cli_engine_of_some_modes():
+    from bratiaa.agree_cli import parse_args
+
+    assert parse_args(['data/agreement/agree-2', '--modes', 'instance,token', '--engine', 'bitset']).engine == 'bitset'
+
+
+def test_cli_unknown_reference(capsys):
+    from bratiaa.agree_cli import parse_args
+
+    with pytest.raises(SystemExit):
+        parse_args(['example-files/example-project', '--reference', 'gold'])
+    assert 'Unknown reference annotator "gold"' in capsys.readouterr().err
+    assert parse_args(['example-files/example-project', '--reference', 'Lisa']).reference == 'Lisa'
+
+
+@pytest.mark.parametrize('args, message', [(['--pairs', 'Lisa:Nobody'], 'Unknown annotator in pair (Lisa, Nobody)'),
+                                           (['--pairs', 'Lisa:Lisa'], 'Cannot compare annotator Lisa with itself'),
+                                           (['--sample-pairs', '0'], "invalid positive number: '0'"),
+                                           (['--sample-pairs', 'two'], 'invalid positive_int value')])
+def test_cli_invalid_pairs(args, message, capsys):
+    from bratiaa.agree_cli import parse_args
+
+    with pytest.raises(SystemExit):
+        parse_args(['example-files/example-project'] + args)
+    assert message in capsys.readouterr().err
+
+
+def test_cli_cache_limits_need_cache_dir(capsys):
+    from bratiaa.agree_cli import parse_args
+
+    with pytest.raises(SystemExit):
+        parse_args(['example-files/example-project', '--cache-max-age', '30'])
+    assert 'need --cache-dir' in capsys.readouterr().err
@@ -59,3 +59,19 @@ def test_token_per_document(token_f1):
                                   [0.971772, 0.945131, 0.927706, 0.942524, 0.973579, 0.976562, 0.951711])
     npt.assert_array_almost_equal(sd,
                                   [0.008875, 0.033929, 0.046871, 0.035116, 0.01296, 0.009569, 0.019581])
+
+
+@pytest.mark.parametrize('token_func', [None, tokenize])
+def test_parallel_equals_serial(instance_f1, token_f1, token_func):
+    serial = token_f1 if token_func else instance_f1
+    parallel = compute_f1_agreement(EXAMPLE_PROJECT, token_func=token_func, n_jobs=2)
+    npt.assert_array_equal(parallel._pdcl, serial._pdcl)
+
+
+def test_sparse_equals_dense(instance_f1):
+    sparse_f1 = compute_f1_agreement(EXAMPLE_PROJECT, storage='sparse')
+    npt.assert_array_equal(sparse_f1._pdcl, instance_f1._pdcl)
+    assert sparse_f1.mean_sd_total() == instance_f1.mean_sd_total()
+    npt.assert_array_equal(sparse_f1.mean_sd_per_label(), instance_f1.mean_sd_per_label())
+    npt.assert_array_equal(sparse_f1.mean_sd_per_document(), instance_f1.mean_sd_per_document())
+    npt.assert_array_equal(sparse_f1.compute_total_f1_matrix(), instance_f1.compute_total_f1_matrix())
@@ -0,0 +1,155 @@
+import os
+import shutil
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from bratiaa.agree import compute_f1_agreement, F1Agreement, input_generator
+from bratiaa.cache import CountCache, TokenCache, prune
+from bratiaa.utils import tokenize
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / 'project'
+    shutil.copytree(EXAMPLE_PROJECT, root)
+    return str(root)
+
+
+@pytest.mark.parametrize('token_func', [None, tokenize])
+def test_rerun_hits_cache(project, tmp_path, token_func):
+    cache_dir = tmp_path / 'cache'
+    first = compute_f1_agreement(project, token_func=token_func, cache_dir=cache_dir)
+    assert first.cache.stats() == (0, 7)
+    second = compute_f1_agreement(project, token_func=token_func, cache_dir=cache_dir)
+    assert second.cache.stats() == (7, 0)
+    npt.assert_array_equal(second._pdcl, first._pdcl)
+
+
+def test_changed_document_is_reevaluated(project, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    compute_f1_agreement(project, cache_dir=cache_dir)
+    ann_path = Path(project) / 'Max' / 'esp.train-doc-46.ann'
+    ann_path.write_text(ann_path.read_text(encoding='utf-8').split('\n', 1)[1], encoding='utf-8')
+    rerun = compute_f1_agreement(project, cache_dir=cache_dir)
+    assert rerun.cache.stats() == (6, 1)
+    npt.assert_array_equal(rerun._pdcl, compute_f1_agreement(project)._pdcl)
+
+
+def test_changed_labels_invalidate_cache(project, tmp_path):
+    cache = CountCache(tmp_path / 'cache')
+    input_gen = partial(input_generator, project)
+    F1Agreement(input_gen, ['LOC', 'MISC', 'ORG', 'PER'], cache=cache)
+    F1Agreement(input_gen, ['LOC', 'MISC', 'ORG', 'OTHER', 'PER'], cache=cache)
+    assert cache.stats() == (0, 14)
+
+
+def test_parallel_cache_stats(project, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    compute_f1_agreement(project, cache_dir=cache_dir, n_jobs=2)
+    assert compute_f1_agreement(project, cache_dir=cache_dir, n_jobs=2).cache.stats() == (7, 0)
+
+
+def whitespace_and_punctuation(text):
+    return tokenize(text.replace('.', ' '))
+
+
+def test_token_cache_shared_by_agreements(tmp_path):
+    token_cache = TokenCache()
+    first = compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize, token_cache=token_cache)
+    assert token_cache.stats() == (0, 7)
+    second = compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize, engine='bitset', token_cache=token_cache)
+    assert token_cache.stats() == (7, 7)
+    npt.assert_array_equal(first._pdcl, compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize)._pdcl)
+    npt.assert_array_equal(second._pdcl, first._pdcl)
+    compute_f1_agreement(EXAMPLE_PROJECT, token_func=whitespace_and_punctuation, token_cache=token_cache)
+    assert token_cache.stats() == (7, 14)
+
+
+def test_token_cache_on_disk(tmp_path):
+    text = 'University of Jena'
+    TokenCache(tmp_path).token_overlap(text, tokenize)
+    token_cache = TokenCache(tmp_path)
+    token_overlap = token_cache.token_overlap(text, tokenize)
+    assert token_cache.stats() == (1, 0)
+    assert isinstance(token_overlap.starts.base, np.memmap)
+    assert token_overlap.tokens == [(0, 10), (11, 13), (14, 18)]
+    assert token_overlap.overlapping_tokens(5, 15) == [(0, 10), (11, 13), (14, 18)]
+
+
+def test_token_cache_lru():
+    token_cache = TokenCache(maxsize=2)
+    for text in ['a', 'b', 'a', 'c', 'b']:
+        token_cache.token_overlap(text, tokenize)
+    assert token_cache.stats() == (1, 4)
+
+
+def test_lambda_tokenizers_do_not_collide():
+    token_cache = TokenCache()
+    tokenizers = [lambda text: tokenize(text), lambda text: tokenize(text.replace('.', ' '))]
+    token_overlaps = [token_cache.token_overlap('Jena. Germany', token_func) for token_func in tokenizers]
+    assert token_cache.stats() == (0, 2)
+    assert token_overlaps[0].tokens == [(0, 5), (6, 13)]
+    assert token_overlaps[1].tokens == [(0, 4), (6, 13)]
+
+
+def test_closures_do_not_collide(project, tmp_path):
+    def splitting_on(separator):
+        return lambda text: tokenize(text.replace(separator, ' '))
+
+    cache_dir = tmp_path / 'cache'
+    compute_f1_agreement(project, token_func=splitting_on('.'), cache_dir=cache_dir)
+    rerun = compute_f1_agreement(project, token_func=splitting_on(','), cache_dir=cache_dir)
+    assert rerun.cache.stats() == (0, 7)
+    npt.assert_array_equal(rerun._pdcl, compute_f1_agreement(project, token_func=splitting_on(','))._pdcl)
+    assert compute_f1_agreement(project, token_func=splitting_on(','), cache_dir=cache_dir).cache.stats() == (7, 0)
+
+
+def test_compact_entries(tmp_path):
+    cache = CountCache(tmp_path)
+    counts = np.zeros((435, 2, 200), dtype=np.int64)  # 30 annotators, 200 labels
+    counts[:, :, 3] = 2
+    counts[7, 1, 150] = 5
+    cache.store('ab' * 20, counts)
+    npt.assert_array_equal(cache.load('ab' * 20), counts)
+    assert sum(path.stat().st_size for path in tmp_path.rglob('*.npz')) < counts.size * 4 // 100
+
+
+def test_prune(project, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    token_cache_dir = cache_dir / 'tokens'
+    compute_f1_agreement(project, token_func=tokenize, cache_dir=cache_dir, token_cache=TokenCache(token_cache_dir))
+    entries = sorted(cache_dir.rglob('*.np[yz]'))
+    assert len(entries) == 14
+    an_hour_ago = time.time() - 3600
+    for path in entries:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+    # hits mark count and token entries as used
+    compute_f1_agreement(project, token_func=tokenize, cache_dir=cache_dir)
+    compute_f1_agreement(project, token_func=tokenize, token_cache=TokenCache(token_cache_dir))
+    assert prune(cache_dir, max_age=60) == (0, 0)
+    stale = entries[0]
+    os.utime(stale, (an_hour_ago, an_hour_ago))
+    size = stale.stat().st_size
+    assert prune(cache_dir, max_age=60) == (1, size)
+    assert not stale.exists()
+    assert prune(cache_dir, max_size=0)[0] == 13
+    assert not list(cache_dir.rglob('*.np[yz]'))
+
+
+def test_prune_least_recently_used(tmp_path):
+    cache = CountCache(tmp_path)
+    for i, key in enumerate(['aa' * 20, 'bb' * 20, 'cc' * 20]):
+        cache.store(key, np.full((1, 2, 3), i + 1))
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    cache.load('aa' * 20)  # most recently used
+    sizes = {path.name: path.stat().st_size for path in tmp_path.rglob('*.npz')}
+    prune(tmp_path, max_size=sum(sizes.values()) - 1)
+    assert cache.load('bb' * 20) is None
+    assert cache.load('aa' * 20) is not None and cache.load('cc' * 20) is not None
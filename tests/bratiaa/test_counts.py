@@ -0,0 +1,91 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from bratiaa.counts import DenseCounts, SparseCounts, StreamingCounts, create_counts
+
+
+@pytest.fixture(scope='module')
+def pdcl():
+    rng = np.random.default_rng(0)
+    pdcl = rng.integers(0, 5, size=(3, 4, 2, 5)) * (rng.random((3, 4, 2, 5)) < 0.3)
+    pdcl[:, 2] = 0  # document without annotations
+    return pdcl
+
+
+@pytest.fixture(scope='module', params=[DenseCounts, SparseCounts])
+def counts(request, pdcl):
+    counts = request.param(*pdcl.shape[:2], pdcl.shape[3])
+    for doc_idx in range(pdcl.shape[1]):
+        counts.add(doc_idx, pdcl[:, doc_idx])
+    counts.add(1, pdcl[:, 1])  # counts are added up
+    return counts
+
+
+def expected(pdcl):
+    pdcl = pdcl.copy()
+    pdcl[:, 1] *= 2
+    return pdcl
+
+
+def test_sum_documents(counts, pdcl):
+    npt.assert_array_equal(counts.sum_documents(), expected(pdcl).sum(axis=1))
+
+
+def test_sum_labels(counts, pdcl):
+    npt.assert_array_equal(counts.sum_labels(), expected(pdcl).sum(axis=3))
+
+
+def test_sum_documents_labels(counts, pdcl):
+    npt.assert_array_equal(counts.sum_documents_labels(), expected(pdcl).sum(axis=(1, 3)))
+
+
+def test_to_dense(counts, pdcl):
+    npt.assert_array_equal(counts.to_dense(), expected(pdcl))
+
+
+def test_dense_counts_read_only(pdcl):
+    counts = DenseCounts(*pdcl.shape[:2], pdcl.shape[3])
+    counts.add(0, pdcl[:, 0])
+    with pytest.raises(ValueError, match='read-only'):
+        counts.to_dense()[0, 0, 0, 0] += 1
+    counts.add(0, pdcl[:, 0])
+    npt.assert_array_equal(counts.to_dense()[:, 0], 2 * pdcl[:, 0])
+
+
+def test_create_counts(monkeypatch):
+    assert isinstance(create_counts(2, 3, 4), DenseCounts)
+    assert isinstance(create_counts(2, 3, 4, storage='sparse'), SparseCounts)
+    assert isinstance(create_counts(2, 3, 4, storage='streaming'), StreamingCounts)
+    monkeypatch.setattr('bratiaa.counts.DENSE_LIMIT', 2 * 3 * 2 * 4 * 4 - 1)
+    assert isinstance(create_counts(2, 3, 4), SparseCounts)
+    with pytest.raises(ValueError, match='Unknown storage'):
+        create_counts(2, 3, 4, storage='compressed')
+
+
+@pytest.mark.parametrize('counts_cls', [DenseCounts, SparseCounts])
+def test_sums_memoized_until_counts_change(counts_cls, pdcl):
+    counts = counts_cls(*pdcl.shape[:2], pdcl.shape[3])
+    counts.add(0, pdcl[:, 0])
+    pcl = counts.sum_documents()
+    assert counts.sum_documents() is pcl
+    assert not pcl.flags.writeable
+    counts.add(1, pdcl[:, 1])
+    npt.assert_array_equal(counts.sum_documents(), pdcl[:, :2].sum(axis=1))
+    pc = counts.sum_documents_labels()
+    counts.add_entries(([0], [3], [1], [0]), [7])
+    assert counts.sum_documents_labels()[0, 1] == pc[0, 1] + 7
+
+
+def test_streaming_counts(pdcl):
+    streaming = StreamingCounts(*pdcl.shape[:2], pdcl.shape[3])
+    dense = DenseCounts(*pdcl.shape[:2], pdcl.shape[3])
+    for doc_idx in range(pdcl.shape[1]):
+        streaming.add(doc_idx, pdcl[:, doc_idx])
+        dense.add(doc_idx, pdcl[:, doc_idx])
+    npt.assert_array_equal(streaming.sum_documents(), dense.sum_documents())
+    npt.assert_array_equal(streaming.sum_documents_labels(), dense.sum_documents_labels())
+    npt.assert_allclose(streaming.document_f1_moments(), dense.document_f1_moments())
+    for per_document in (streaming.sum_labels, streaming.to_dense, streaming.entries):
+        with pytest.raises(ValueError, match='no per-document counts'):
+            per_document()
@@ -0,0 +1,80 @@
+from itertools import combinations
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from bratiaa.agree import compute_f1_agreement
+from bratiaa.engines import instance_bitmask_counts, get_engine, read_token_counts, token_bitset_counts
+from bratiaa.evaluation import *
+from bratiaa.utils import tokenize, TokenOverlap
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+LABELS = ['LOC', 'MISC', 'ORG', 'PER']
+LABEL2IDX = {l: i for i, l in enumerate(LABELS)}
+
+
+def pairwise_counts(parsed, compare=compare_instance_annotations):
+    counts = np.zeros((len(parsed) * (len(parsed) - 1) // 2, 2, len(LABELS)), dtype=np.int64)
+    for cl, (ann_1, ann_2) in zip(counts, combinations(parsed, 2)):
+        tp, exp, pred = compare(ann_1, ann_2)
+        for kind, annotations in ((0, tp), (1, exp), (1, pred)):
+            for a in annotations:
+                cl[kind][LABEL2IDX[a.label]] += 1
+    return counts
+
+
+@pytest.mark.parametrize('num_annotators', [2, 7, 70])
+def test_bitmask_equals_pairwise(num_annotators):
+    rng = np.random.default_rng(num_annotators)
+    candidates = [Annotation('T', LABELS[rng.integers(len(LABELS))], ((int(s), int(s) + 5),))
+                  for s in rng.integers(0, 200, size=60)]
+    parsed = [{a for a in candidates if rng.random() < 0.7} for _ in range(num_annotators)]
+    parsed[0] = set()  # annotator without annotations
+    npt.assert_array_equal(instance_bitmask_counts(parsed, LABEL2IDX), pairwise_counts(parsed))
+
+
+def test_bitmask_unknown_label():
+    with pytest.raises(KeyError, match='OTHER'):
+        instance_bitmask_counts([{Annotation('T', 'OTHER', ((0, 1),))}, set()], LABEL2IDX)
+
+
+def test_bitmask_agreement():
+    pairwise = compute_f1_agreement(EXAMPLE_PROJECT)
+    bitmask = compute_f1_agreement(EXAMPLE_PROJECT, engine='bitmask')
+    npt.assert_array_equal(bitmask._pdcl, pairwise._pdcl)
+
+
+def test_get_engine():
+    assert get_engine('pairwise', TOKEN_EVALUATION) is None
+    assert get_engine('bitmask', INSTANCE_EVALUATION).counts is instance_bitmask_counts
+    assert get_engine('bitset', TOKEN_EVALUATION).counts is token_bitset_counts
+    with pytest.raises(ValueError, match='does not support'):
+        get_engine('bitmask', TOKEN_EVALUATION)
+    with pytest.raises(ValueError, match='Unknown engine'):
+        get_engine('quantum', INSTANCE_EVALUATION)
+
+
+def test_bitset_equals_pairwise(tmp_path):
+    text = 'University of Jena and Human Rights Watch met in Jena .'
+    tokens = TokenOverlap(text, list(tokenize(text)))
+    anns = [
+        'T1\tLOC 0 18\nT2\tLOC 14 18\nT3\tORG 23 41\n',
+        'T1\tLOC 0 18\nT2\tLOC 14 18\nT3\tLOC 14 18\nT4\tORG 23 38\nT5\tLOC 49 53\n',
+        'T1\tLOC 0 10;14 18\nT2\tORG 23 28\nT3\tORG 29 41\nT4\tPER 30 31\n',
+        '',
+    ]
+    ann_paths = []
+    for i, ann in enumerate(anns):
+        ann_paths.append(tmp_path / f'{i}.ann')
+        ann_paths[-1].write_text(ann, encoding='utf-8')
+    expected = pairwise_counts([read_token_annotations(p, tokens) for p in ann_paths], compare_token_annotations)
+    counts = token_bitset_counts([read_token_counts(p, tokens) for p in ann_paths], LABEL2IDX)
+    npt.assert_array_equal(counts, expected)
+    assert counts[0, 0, LABEL2IDX['LOC']] == 4  # University of [Jena] counted twice
+
+
+def test_bitset_agreement():
+    pairwise = compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize)
+    bitset = compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize, engine='bitset')
+    npt.assert_array_equal(bitset._pdcl, pairwise._pdcl)
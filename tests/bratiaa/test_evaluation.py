@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import pytest
+
+import bratsubset.annotation as bs
+from bratiaa.evaluation import read_textbounds
+
+EXAMPLE_PROJECT = Path('example-files/example-project')
+
+
+def brat_textbounds(ann_path):
+    with bs.Annotations(Path(ann_path).as_posix(), read_only=True) as annotations:
+        return [(a.type, tuple(a.spans)) for a in annotations.get_textbounds()]
+
+
+@pytest.mark.parametrize('ann_path', sorted(EXAMPLE_PROJECT.glob('**/*.ann')), ids=str)
+def test_read_textbounds_like_brat(ann_path):
+    assert list(read_textbounds(ann_path)) == brat_textbounds(ann_path)
+
+
+def test_read_textbounds_edge_cases(tmp_path):
+    ann_path = tmp_path / 'doc.ann'
+    ann_path.write_text(
+        'T1\tPER 0 4\tJohn\n'
+        'T2\tLOC 10 14;20 25\tBonn Essen\n'
+        'T3\tORG 1 2 3\tspace instead of tab\n'
+        'T3\tORG 30 33\tduplicate of unparsable ID\n'
+        'T1\tMISC 40 44\tduplicate ID\n'
+        'E1\tPER:T1\n'
+        'A1\tNegated E1\n'
+        '#1\tAnnotatorNotes T2\tnote\n'
+        'Tx\tPER 50 54\tinvalid ID\n'
+        'T4\tPER 60 64\n'
+        'T5 PER 70 74\n'
+        'T6\tPER 80 x\n'
+        '\n'
+        'TB7\tLOC 90 95\tprefixed ID\n',
+        encoding='utf-8'
+    )
+    textbounds = list(read_textbounds(ann_path))
+    assert textbounds == brat_textbounds(ann_path)
+    assert textbounds == [('PER', ((0, 4),)), ('LOC', ((10, 14), (20, 25))), ('PER', ((60, 64),)),
+                          ('LOC', ((90, 95),))]
+
+
+def test_read_textbounds_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(read_textbounds(tmp_path / 'missing.ann'))
+    assert not (tmp_path / 'missing.ann').exists()
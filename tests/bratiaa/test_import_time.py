@@ -0,0 +1,11 @@
+import subprocess
+import sys
+
+# the import time itself is measured by `python -m benchmarks.bench_import`
+HEAVY_MODULES = ['matplotlib', 'scipy', 'tabulate', 'bratsubset.projectconfig', 'concurrent.futures.process']
+
+
+def test_no_heavy_imports():
+    code = f'import sys, bratiaa; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
@@ -0,0 +1,78 @@
+import pytest
+
+from bratiaa.labels import parse_entity_types, read_entity_types
+from bratsubset.projectconfig import ProjectConfiguration
+
+EXAMPLE_PROJECTS = ['example-files/example-project', 'data/agreement/agree-2']
+
+CONFIGS = {
+    'hierarchy': '[entities]\nThing\n Person\n  Artist\n Place\nOther\n\n[relations]\n',
+    'stale parent': '[entities]\nA\n B\nC\n  D\n',
+    'unused, aliases, args': '[spans]\n!Abstract\n\tConcrete | Alias, Arg:Thing\n# comment\n----\n'
+                             'Geo-Political Entity\n',
+    'storage form': '[entities]\nFoo.Bar\nBäz\n',
+    'several sections': '[entities]\nA\n[events]\nE\tTheme:A\n[entities]\nB\n',
+    'macros': '[entities]\nPerson\n[relations]\n<ENT>=Person\nRel\tArg1:<ENT>, Arg2:<ENT>\n',
+    'entity macro': '[entities]\n<ENT>=Person\nPerson\tArg:<ENT>\n',
+    'undefined macro': '[entities]\nPerson\tArg:<UNDEFINED>\n',
+    'deprecated space in term': '[entities]\nNamed entity\tArg: a b\n',
+    'no parent': '[entities]\n Orphan\n',
+    'valid arguments': ('[entities]\nPerson\tAlias:Per, Opt?:A, Range{1-3}:B|C, Other*:D\n'
+                        '[relations]\n<ENT>=Person\nRel\tArg1:<ENT>, Arg2:<ENT>, <REL-TYPE>:symmetric\n'
+                        '<OVERLAP>\tArg1:Person, Arg2:Person, <OVL-TYPE>:<ANY>\n'
+                        '[events]\nE\tTheme:Person\n Sub\t<INHERIT>, Cause?:Person\n[attributes]\nNeg\tArg:<EVENT>\n'),
+    'labels section': '[entities]\nA\n[labels]\nA | Label A | LA\n',
+}
+
+# configurations brat rejects (falling back to a minimal configuration)
+INVALID_CONFIGS = {
+    'entity argument without colon': '[entities]\nPerson\tfoo\n',
+    'invalid range': '[entities]\nA\tArg{0}:B\n',
+    'reversed range': '[entities]\nA\tArg{3-1}:B\n',
+    'repeated argument ending with digit': '[entities]\nA\tArg1+:B\n',
+    'duplicate argument': '[entities]\nA\tArg:B, Arg:C\n',
+    'empty argument type': '[entities]\nA\tArg:B|\n',
+    'undefined macro in events': '[entities]\nA\n[events]\nE\tTheme:<UNDEFINED>\n',
+    'reserved macro': '[entities]\nA\n[relations]\n<ANY>=A\n',
+    'relation argument without type': '[entities]\nA\n[relations]\nR\tArg1\n',
+    'inherit without parent': '[entities]\nA\n[events]\nE\t<INHERIT>\n',
+    'no parent in attributes': '[entities]\nA\n[attributes]\n Neg\tArg:<EVENT>\n',
+    'unknown section with spaces': '[entities]\nA\n[notes]\nsome free text here\n',
+    'general section': 'free text\n[entities]\nA\n',
+}
+
+
+def brat_entity_types(project_root):
+    return ProjectConfiguration(str(project_root)).get_entity_types()
+
+
+@pytest.mark.parametrize('project_root', EXAMPLE_PROJECTS)
+def test_example_projects(project_root):
+    assert read_entity_types(project_root) == brat_entity_types(project_root)
+
+
+@pytest.mark.parametrize('name', sorted(CONFIGS))
+def test_equals_brat(tmp_path, name):
+    (tmp_path / 'annotation.conf').write_text(CONFIGS[name], encoding='utf8')
+    assert read_entity_types(str(tmp_path)) == brat_entity_types(tmp_path)
+
+
+@pytest.mark.parametrize('name', sorted(INVALID_CONFIGS))
+def test_invalid_equals_brat(tmp_path, name):
+    with pytest.raises(ValueError):
+        parse_entity_types(INVALID_CONFIGS[name])
+    (tmp_path / 'annotation.conf').write_text(INVALID_CONFIGS[name], encoding='utf8')
+    assert read_entity_types(str(tmp_path)) == brat_entity_types(tmp_path) == ['Protein']
+
+
+@pytest.mark.parametrize('name', ['hierarchy', 'valid arguments', 'labels section'])
+def test_fast_path(name):
+    parse_entity_types(CONFIGS[name])  # no fallback
+
+
+def test_hierarchy_order():
+    assert parse_entity_types(CONFIGS['hierarchy']) == ['Thing', 'Person', 'Artist', 'Place', 'Other']
+
+
+def test_missing_config(tmp_path):
+    assert read_entity_types(str(tmp_path)) == brat_entity_types(tmp_path)
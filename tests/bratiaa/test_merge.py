@@ -0,0 +1,65 @@
+import numpy.testing as npt
+import pytest
+
+from bratiaa.agree import *
+from bratiaa.utils import tokenize
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+LABELS = ['LOC', 'MISC', 'ORG', 'PER']
+
+
+def shard_generator(root, shard, num_shards=2, annotators=None):
+    for i, document in enumerate(input_generator(root)):
+        if i % num_shards == shard:
+            if annotators:
+                document.ann_files = [f for f in document.ann_files if f.annotator_id in annotators]
+            yield document
+
+
+def assert_same_statistics(f1_agreement, expected):
+    assert f1_agreement.annotators == expected.annotators
+    assert f1_agreement.documents == expected.documents
+    assert f1_agreement.labels == expected.labels
+    npt.assert_array_equal(f1_agreement._pdcl, expected._pdcl)
+    assert f1_agreement.mean_sd_total() == expected.mean_sd_total()
+    npt.assert_array_equal(f1_agreement.mean_sd_per_label(), expected.mean_sd_per_label())
+    npt.assert_array_equal(f1_agreement.mean_sd_per_document(), expected.mean_sd_per_document())
+
+
+@pytest.mark.parametrize('storage', ['dense', 'sparse'])
+def test_save_load(tmp_path, storage):
+    f1_agreement = F1Agreement(partial(input_generator, EXAMPLE_PROJECT), LABELS, token_func=tokenize,
+                               eval_func=exact_match_token_evaluation)
+    f1_agreement.save(tmp_path / 'agreement.npz')
+    loaded = F1Agreement.load(tmp_path / 'agreement.npz', storage=storage)
+    assert_same_statistics(loaded, f1_agreement)
+    assert loaded._token_based
+
+
+def test_merge_shards(tmp_path):
+    full = F1Agreement(partial(input_generator, EXAMPLE_PROJECT), LABELS)
+    for shard in range(3):
+        F1Agreement(partial(shard_generator, EXAMPLE_PROJECT, shard, 3), LABELS).save(tmp_path / f'{shard}.npz')
+    merged = merge(*(F1Agreement.load(tmp_path / f'{shard}.npz') for shard in range(3)))
+    assert_same_statistics(merged, full)
+
+
+def test_merge_aligns_annotators_and_labels():
+    full = F1Agreement(partial(shard_generator, EXAMPLE_PROJECT, 0, 1, annotators=['Lisa', 'Maria', 'Max']),
+                       LABELS + ['OTHER'])
+    shard_1 = F1Agreement(partial(shard_generator, EXAMPLE_PROJECT, 0, annotators=['Lisa', 'Max']), LABELS)
+    shard_2 = F1Agreement(partial(shard_generator, EXAMPLE_PROJECT, 1, annotators=['Lisa', 'Maria', 'Max']),
+                          ['OTHER'] + LABELS)
+    merged = merge(shard_1, shard_2)
+    assert merged.annotators == ['Lisa', 'Maria', 'Max']
+    assert merged.labels == ['LOC', 'MISC', 'ORG', 'OTHER', 'PER']
+    expected = full._pdcl[:, :, :, [0, 1, 2, 4, 3]]
+    expected[full._pair2idx[('Lisa', 'Maria')], ::2] = 0  # Maria only annotated in the second shard
+    expected[full._pair2idx[('Maria', 'Max')], ::2] = 0
+    npt.assert_array_equal(merged._pdcl, expected)
+
+
+def test_merge_overlapping_shards():
+    f1_agreement = F1Agreement(partial(input_generator, EXAMPLE_PROJECT), LABELS)
+    with pytest.raises(ValueError, match='sharing documents'):
+        merge(f1_agreement, f1_agreement)
@@ -0,0 +1,40 @@
+import json
+
+from bratiaa.agree import compute_f1_agreement, iaa_report
+from bratiaa.profiling import Profile, stage
+from bratiaa.utils import tokenize
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+
+
+def test_stages(capsys):
+    profile = Profile()
+    f1_agreement = compute_f1_agreement(EXAMPLE_PROJECT, token_func=tokenize, profile=profile)
+    iaa_report(f1_agreement)
+    stages = profile.to_dict()
+    assert list(stages) == ['config', 'scan', 'tokenize', 'parse', 'compare', 'accumulate', 'report']
+    assert stages['scan']['documents'] == stages['accumulate']['documents'] == 7
+    assert stages['parse']['calls'] == 7
+    assert stages['parse']['bytes_read'] > 0 and stages['tokenize']['bytes_read'] > 0
+    assert all(record['seconds'] >= 0 for record in stages.values())
+
+
+def test_parallel_equals_serial():
+    serial, parallel = Profile(), Profile()
+    compute_f1_agreement(EXAMPLE_PROJECT, profile=serial)
+    compute_f1_agreement(EXAMPLE_PROJECT, n_jobs=2, profile=parallel)
+    for name in ('scan', 'parse', 'compare', 'accumulate'):
+        for field in ('calls', 'bytes_read', 'documents'):
+            assert serial.stages[name][field] == parallel.stages[name][field]
+
+
+def test_save_and_table(tmp_path):
+    profile = Profile()
+    with stage(profile, 'scan'):
+        profile.add('scan', documents=3)
+    with stage(None, 'ignored'):
+        pass
+    path = tmp_path / 'profile.json'
+    profile.save(str(path))
+    assert json.loads(path.read_text())['scan']['documents'] == 3
+    assert '| scan' in profile.table()
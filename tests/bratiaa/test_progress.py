@@ -0,0 +1,56 @@
+import io
+from pathlib import Path
+
+from bratiaa.agree import compute_f1_agreement, compute_f1_agreements
+from bratiaa.progress import Progress, ProgressLine
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+
+
+def test_callback():
+    updates = []
+    compute_f1_agreement(EXAMPLE_PROJECT, progress=updates.append)
+    assert updates[0] == Progress(0, 7, 0, 0)
+    assert [p.documents_done for p in updates] == list(range(8))
+    assert all(p.documents_total == 7 for p in updates)
+    assert updates[-1].files_parsed == 4 * 7
+    assert 0 < updates[1].bytes_read < updates[-1].bytes_read
+
+
+def test_callback_parallel_and_modes():
+    serial, parallel = [], []
+    compute_f1_agreements(EXAMPLE_PROJECT, progress=serial.append)
+    compute_f1_agreements(EXAMPLE_PROJECT, n_jobs=2, progress=parallel.append)
+    assert serial == parallel
+    # texts are read for the token-based mode
+    instance = []
+    compute_f1_agreement(EXAMPLE_PROJECT, progress=instance.append)
+    assert serial[-1].bytes_read > instance[-1].bytes_read
+
+
+def test_progress_line():
+    stream = io.StringIO()
+    line = ProgressLine(stream, interval=3600)
+    line(Progress(0, 4, 0, 0))
+    line(Progress(1, 4, 2, 2 ** 20))  # throttled
+    line(Progress(4, 4, 8, 4 * 2 ** 20))
+    output = stream.getvalue()
+    assert output.count('\r') == 2
+    assert '0/4 documents (0.0%)' in output
+    assert '4/4 documents (100.0%), 8 files' in output and 'done in 0:00:00' in output
+    assert output.endswith('\n')
+
+
+def test_format_eta():
+    assert ProgressLine.format(Progress(10, 40, 20, 2 ** 21), 5.0) == \
+        '10/40 documents (25.0%), 20 files, 2.0 docs/s, 0.40 MB/s, ETA 0:00:15'
+
+
+def test_bytes_counted_from_reads(tmp_path, monkeypatch):
+    expected = sum(path.stat().st_size for path in Path(EXAMPLE_PROJECT).glob('*/*.ann'))
+    monkeypatch.setattr('os.path.getsize', None)  # sizes come from the reads themselves
+    first, second = [], []
+    compute_f1_agreement(EXAMPLE_PROJECT, cache_dir=tmp_path, progress=first.append)
+    assert first[-1].bytes_read == expected
+    compute_f1_agreement(EXAMPLE_PROJECT, cache_dir=tmp_path, progress=second.append)
+    assert second[-1] == Progress(7, 7, 0, 0)  # all documents answered by the cache
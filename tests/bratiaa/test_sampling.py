@@ -0,0 +1,77 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from bratiaa.agree import compute_f1_agreement, compute_f1_agreements, iaa_report, Document
+from bratiaa.sampling import Sampling, StratifiedSample
+
+EXAMPLE_PROJECT = 'example-files/example-project'
+
+
+def documents(sizes):
+    return [Document(f'{stratum}/doc-{i}.txt', doc_id=f'{stratum}/doc-{i}.ann')
+            for stratum, size in enumerate(sizes) for i in range(size)]
+
+
+def test_stratified_batches():
+    sample = StratifiedSample(documents([60, 30, 10]), rng=np.random.default_rng(0))
+    batch = sample.draw(20)
+    assert [sum(d.doc_id.startswith(f'{s}/') for d in batch) for s in range(3)] == [12, 6, 2]
+    drawn = list(batch)
+    while not sample.exhausted:
+        drawn.extend(sample.draw(20))
+    assert sorted(d.doc_id for d in drawn) == sorted(d.doc_id for d in documents([60, 30, 10]))
+    assert sample.draw(20) == []
+
+
+def test_every_stratum_sampled():
+    sample = StratifiedSample(documents([100, 1, 1]), rng=np.random.default_rng(0))
+    batch = sample.draw(10)
+    assert {d.doc_id.split('/')[0] for d in batch} == {'0', '1', '2'}
+    strata, weights, complete = sample.design([d.doc_id for d in batch])
+    npt.assert_array_equal(complete, [False, True, True])
+    npt.assert_array_equal(weights[strata == 1], [1.0])
+
+
+def test_exhausted_sample_equals_full_run(capsys):
+    full = compute_f1_agreement(EXAMPLE_PROJECT)
+    sampled = compute_f1_agreement(EXAMPLE_PROJECT, sampling=Sampling(width=0, batch_size=3, seed=0))
+    estimate = sampled.estimate
+    assert estimate.documents_sampled == estimate.documents_total == 7
+    assert sampled.documents == full.documents
+    assert sampled.mean_sd_total() == full.mean_sd_total()
+    assert estimate.total == pytest.approx(full.mean_sd_total()[0])
+    assert estimate.total_ci == pytest.approx((estimate.total, estimate.total))  # nothing left to resample
+    npt.assert_allclose(estimate.per_label, full.mean_sd_per_label()[0])
+    iaa_report(sampled)
+    assert '* 7 of 7 documents sampled from 1 strata' in capsys.readouterr().out
+
+
+def test_stop_at_target_width():
+    agreements = compute_f1_agreements(EXAMPLE_PROJECT, sampling=Sampling(width=1, batch_size=2, seed=0))
+    for f1_agreement in agreements.values():
+        estimate = f1_agreement.estimate
+        assert estimate.documents_sampled == len(f1_agreement.documents) == 2
+        lower, upper = estimate.total_ci
+        assert lower <= estimate.total <= upper and upper - lower <= 1
+
+
+def test_progress_across_batches():
+    reports = []
+    compute_f1_agreement(EXAMPLE_PROJECT, sampling=Sampling(width=0, batch_size=3, seed=0), progress=reports.append)
+    assert {p.documents_total for p in reports} == {7}
+    assert [p.documents_done for p in reports] == sorted(p.documents_done for p in reports)
+    assert reports[-1].documents_done == 7 and reports[-1].files_parsed == 7 * 4
+
+
+def test_progress_stopped_early():
+    reports = []
+    compute_f1_agreements(EXAMPLE_PROJECT, sampling=Sampling(width=1, batch_size=2, seed=0), progress=reports.append)
+    assert {p.documents_total for p in reports[:-1]} == {7}
+    assert reports[-1].documents_done == reports[-1].documents_total == 2
+
+
+def test_sampling_needs_per_document_counts():
+    for compute in (compute_f1_agreement, compute_f1_agreements):
+        with pytest.raises(ValueError, match='streaming storage'):
+            compute(EXAMPLE_PROJECT, storage='streaming', sampling=Sampling())
@@ -0,0 +1,56 @@
+import numpy.testing as npt
+import pytest
+
+from bratiaa.agree import input_generator, compute_f1_agreements
+from bratiaa.scan import scan_ann_files, list_subdirectories
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = [
+        'ann-1/doc-1.ann', 'ann-1/doc-3.ann', 'ann-1/second/doc-2.ann', 'ann-1/second/third/doc-5.ann',
+        'ann-1/.hidden/doc-6.ann', 'ann-1/doc-1.txt',
+        'ann-2/doc-3.ann', 'ann-2/doc-4.ann', 'ann-2/second/doc-2.ann', 'ann-2/second/third/doc-5.ann',
+        'ann-2/.hidden/doc-6.ann', 'ann-2/.doc-7.ann',
+        '.git/doc-3.ann',
+    ]
+    for rel_path in files:
+        path = tmp_path / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    (tmp_path / 'annotation.conf').touch()
+    return tmp_path
+
+
+def test_list_subdirectories(project):
+    assert list_subdirectories(project) == ['ann-1', 'ann-2']
+
+
+@pytest.mark.parametrize('threads', [None, 4])
+def test_scan_ann_files(project, threads):
+    directories = [str(project / 'ann-1'), str(project / 'ann-2')]
+    rel_paths = scan_ann_files(directories, threads=threads)
+    assert sorted(rel_paths[directories[0]]) == ['doc-1.ann', 'doc-3.ann', 'second/doc-2.ann',
+                                                 'second/third/doc-5.ann']
+    assert sorted(rel_paths[directories[1]]) == ['doc-3.ann', 'doc-4.ann', 'second/doc-2.ann',
+                                                 'second/third/doc-5.ann']
+
+
+@pytest.mark.parametrize('threads', [None, 4])
+def test_input_generator(project, threads):
+    documents = list(input_generator(project, threads=threads))
+    assert [d.doc_id for d in documents] == ['doc-3.ann', 'second/doc-2.ann', 'second/third/doc-5.ann']
+    document = documents[1]
+    # same types as the former glob-based generator: text path as POSIX string, ANN paths as Path objects
+    assert document.txt_path == (project / 'ann-1' / 'second' / 'doc-2.txt').as_posix()
+    assert document.ann_files == [('ann-1', project / 'ann-1' / 'second' / 'doc-2.ann'),
+                                  ('ann-2', project / 'ann-2' / 'second' / 'doc-2.ann')]
+    assert document.ann_files[0].ann_path.as_posix() == f'{project}/ann-1/second/doc-2.ann'
+
+
+def test_scan_threads():
+    project = 'example-files/example-project'
+    threaded = compute_f1_agreements(project, scan_threads=4)
+    for name, f1_agreement in compute_f1_agreements(project).items():
+        assert threaded[name].documents == f1_agreement.documents
+        npt.assert_array_equal(threaded[name]._pdcl, f1_agreement._pdcl)
@@ -1,3 +1,5 @@
+import pytest
+
 from bratiaa.utils import TokenOverlap
 
 
@@ -55,3 +57,53 @@ def test_spans_overlapping_tokens():
 
     assert to.overlapping_tokens(6, 11) == [(5, 7), (8, 9), (10, 18)]
     assert to.overlapping_tokens(5, 15) == [(5, 7), (8, 9), (10, 18)]
+
+
+def char2token_overlap(text, tokens, start, end):
+    """
+    Reference implementation based on a per-character token index.
+    """
+    char2token = [-1] * len(text)
+    for token_idx, (token_start, token_end) in enumerate(tokens):
+        for i in range(token_start, len(text)):
+            char2token[i] = token_idx
+    if end < 1 or start >= end:
+        return []
+    start_token = max(char2token[start], 0)
+    if tokens[start_token][1] <= start:
+        start_token += 1
+    end_token = char2token[end - 1]
+    if end_token < 0 or end_token < start_token:
+        return []
+    return tokens[start_token:end_token + 1]
+
+
+def test_all_spans_match_reference():
+    text = '   This is a sentence.  '
+    tokens = [(3, 7), (8, 10), (11, 12), (13, 21), (21, 22)]
+    to = TokenOverlap(text, tokens)
+    spans = [(start, end) for start in range(len(text)) for end in range(len(text) + 1)]
+    for start, end in spans:
+        assert to.overlapping_tokens(start, end) == char2token_overlap(text, tokens, start, end)
+    first, last = to.token_ranges([s for s, _ in spans], [e for _, e in spans])
+    assert [to.token_range(start, end) for start, end in spans] == list(zip(first.tolist(), last.tolist()))
+
+
+def test_end_after_text():
+    to = TokenOverlap('This', [(0, 4)])
+    with pytest.raises(AssertionError, match='> text length'):
+        to.overlapping_tokens(0, 5)
+    with pytest.raises(AssertionError, match='> text length'):
+        to.token_ranges([0], [5])
+
+
+def test_deprecated_char2token():
+    text = '   This is a sentence.  '
+    tokens = [(3, 7), (8, 10), (11, 12), (13, 21), (21, 22)]
+    to = TokenOverlap(text, tokens)
+    assert not hasattr(to, '_tokens')
+    with pytest.deprecated_call():
+        char2token = to.char2token
+    with pytest.deprecated_call():
+        assert char2token.tolist() == TokenOverlap.compute_mapping(len(text), tokens).tolist()
+    assert char2token.tolist() == [-1, -1, -1, 0, 0, 0, 0, 0, 1, 1, 1, 2, 2, 3, 3, 3, 3, 3, 3, 3, 3, 4, 4, 4]
@@ -0,0 +1,72 @@
+import io
+import logging
+
+import pytest
+
+from bratsubset.realmessage import Messager
+
+
+@pytest.fixture(autouse=True)
+def buffer_sink():
+    Messager.configure()
+    yield
+    Messager.configure()
+
+
+def test_escaping_deferred_to_output_json():
+    Messager.warning('a < b')
+    Messager.warning('<b>bold</b>', escaped=True)
+    assert Messager.output_json({})['messages'] == [('a &lt; b', 'warning', 3), ('<b>bold</b>', 'warning', 3)]
+    assert Messager.output_json({})['messages'] == []
+
+
+def test_duplicates_counted():
+    for _ in range(3):
+        Messager.error('mismatch')
+    Messager.error('other')
+    assert Messager.pending() == 2
+    assert Messager.output_json({})['messages'] == [
+        ('mismatch<br/><b>[message repeated 3 times]</b>', 'error', 3), ('other', 'error', 3)]
+
+
+def test_bounded_buffer():
+    Messager.configure(maxlen=2)
+    for i in range(5):
+        Messager.info(i)
+    assert Messager.pending() == 2
+    assert Messager.output_json({})['messages'] == [
+        ('3', 'comment', 3), ('4', 'comment', 3), ('[3 older messages dropped]', 'warning', 3)]
+
+
+def test_off():
+    Messager.configure('off')
+    Messager.error('lost')
+    assert Messager.pending() == 0
+    assert Messager.output_json({})['messages'] == []
+
+
+def test_logging(caplog):
+    Messager.configure('logging')
+    with caplog.at_level(logging.DEBUG, logger='bratsubset'):
+        Messager.warning('a < b')
+        Messager.debug('details')
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.WARNING, 'a < b'),
+                                                                    (logging.DEBUG, 'details')]
+    assert Messager.pending() == 0
+
+
+def test_unknown_sink():
+    with pytest.raises(ValueError):
+        Messager.configure('stdout')
+
+
+def test_output_keeps_messages():
+    Messager.warning('a < b')
+    Messager.warning('a < b')
+    for _ in range(2):
+        out = io.StringIO()
+        Messager.output(out)
+        assert out.getvalue() == 'warning : a &lt; b [message repeated 2 times]\n'
+    assert Messager.pending() == 1
+    Messager.clear()
+    assert Messager.pending() == 0
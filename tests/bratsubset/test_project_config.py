@@ -1,7 +1,61 @@
-from bratsubset.projectconfig import ProjectConfiguration
+import os
+import shutil
+
+import pytest
+
+from bratsubset.projectconfig import CONFIG_CACHE, ConfigCache, ProjectConfiguration, get_entity_type_list
+
+EXAMPLE_PROJECT = 'example-files/example-project'
 
 
 def test_reading_entity_types():
     project_root = 'data/agreement/agree-2'
     config = ProjectConfiguration(project_root)
     assert config.get_entity_types() == ['ORG', 'PER', 'LOC', 'MISC']
+
+
+@pytest.fixture
+def project(tmp_path):
+    shutil.copy(os.path.join(EXAMPLE_PROJECT, 'annotation.conf'), str(tmp_path))
+    CONFIG_CACHE.clear()
+    yield str(tmp_path)
+    CONFIG_CACHE.clear()
+
+
+def entity_types(project):
+    return ProjectConfiguration(project).get_entity_types()
+
+
+def test_hits(project):
+    assert entity_types(project) == ['ORG', 'PER', 'LOC', 'MISC']
+    misses = CONFIG_CACHE.misses
+    assert entity_types(project) == ['ORG', 'PER', 'LOC', 'MISC']
+    assert CONFIG_CACHE.misses == misses
+    assert CONFIG_CACHE.hits > 0
+
+
+def test_invalidated_on_change(project):
+    assert entity_types(project) == ['ORG', 'PER', 'LOC', 'MISC']
+    with open(os.path.join(project, 'annotation.conf'), 'a') as f:
+        f.write('\n[entities]\nDATE\n')
+    assert entity_types(project) == ['ORG', 'PER', 'LOC', 'MISC', 'DATE']
+    assert CONFIG_CACHE.invalidations > 0
+
+
+def test_lru_eviction(tmp_path):
+    cache = ConfigCache(maxsize=2)
+    path = str(tmp_path / 'missing.conf')
+    for key in ['a', 'b', 'a', 'c']:
+        cache.get(key, [path], lambda: key)
+    assert cache.stats() == {'entries': 2, 'hits': 1, 'misses': 3, 'invalidations': 0, 'evictions': 1}
+    assert cache.get('a', [path], lambda: 'new') == 'a'
+    assert cache.get('b', [path], lambda: 'new') == 'new'
+
+
+def test_bounded(project):
+    CONFIG_CACHE.maxsize = 3
+    try:
+        get_entity_type_list(project)
+        assert len(CONFIG_CACHE) <= 3
+    finally:
+        CONFIG_CACHE.maxsize = ConfigCache().maxsize